@@ -0,0 +1,54 @@
+import type { NextApiRequest, NextApiResponse } from 'next';
+import { query } from '../../utils/db';
+
+// Versioned snapshot published by the pipeline's snapshot stage (scripts/snapshot.py)
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  try {
+    // Only the version first, so a revalidation never transfers the snapshot
+    const latest = await query(`
+      SELECT version, brotli IS NOT NULL AS has_brotli
+      FROM reading_snapshots
+      ORDER BY published_at DESC
+      LIMIT 1
+    `);
+    if (latest.rows.length === 0) {
+      res.status(404).json({ error: 'No snapshot available, run the snapshot stage' });
+      return;
+    }
+    const { version, has_brotli } = latest.rows[0];
+    const etag = `"${version}"`;
+    res.setHeader('ETag', etag);
+    res.setHeader('Cache-Control', 'public, max-age=0, must-revalidate');
+    res.setHeader('Vary', 'Accept-Encoding');
+
+    if (req.headers['if-none-match'] === etag) {
+      res.status(304).end();
+      return;
+    }
+
+    // The snapshot is stored compressed; pick the best encoding the client accepts
+    const accepted = String(req.headers['accept-encoding'] || '');
+    const encoding = has_brotli && /\bbr\b/.test(accepted) ? 'br' : 'gzip';
+    if (encoding === 'gzip' && !/\bgzip\b/.test(accepted)) {
+      res.status(406).json({ error: 'Snapshot is only available gzip or brotli encoded' });
+      return;
+    }
+    const column = encoding === 'br' ? 'brotli' : 'gzip';
+    const result = await query(`SELECT ${column} AS body FROM reading_snapshots WHERE version = $1`, [version]);
+    if (result.rows.length === 0) {
+      // Replaced by a newer version between the two queries
+      res.status(503).json({ error: 'Snapshot is being replaced, retry' });
+      return;
+    }
+
+    res.setHeader('Content-Type', 'application/json; charset=utf-8');
+    res.setHeader('Content-Encoding', encoding);
+    res.status(200).send(result.rows[0].body);
+  } catch (err) {
+    console.error('Error:', err);
+    res.status(500).json({ error: 'Failed to fetch book snapshot' });
+  }
+}
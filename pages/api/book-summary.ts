@@ -0,0 +1,48 @@
+import type { NextApiRequest, NextApiResponse } from 'next';
+import pool from '../../utils/db';
+
+// Aggregates precomputed by the Python pipeline's load stage (scripts/summaries.py)
+export default async function handler(
+  req: NextApiRequest,
+  res: NextApiResponse
+) {
+  try {
+    const client = await pool.connect();
+    try {
+      const [years, sources, genres, histogram] = await Promise.all([
+        client.query(`
+          SELECT year_read AS year, book_count, avg_rating, avg_goodreads_rating, fiction_count
+          FROM book_summary_by_year
+          ORDER BY year_read
+        `),
+        client.query(`
+          SELECT source, book_count, avg_rating, avg_goodreads_rating, success_rate, rating_boost
+          FROM book_summary_by_source
+          ORDER BY avg_rating DESC
+        `),
+        client.query(`
+          SELECT year_read AS year, genre, book_count, year_share
+          FROM book_summary_by_genre
+          ORDER BY year_read, book_count DESC
+        `),
+        client.query(`
+          SELECT scale, bucket, book_count
+          FROM book_rating_histogram
+          ORDER BY scale, bucket
+        `),
+      ]);
+
+      res.status(200).json({
+        years: years.rows,
+        sources: sources.rows,
+        genres: genres.rows,
+        ratingHistogram: histogram.rows,
+      });
+    } finally {
+      client.release();
+    }
+  } catch (err) {
+    console.error('Error:', err);
+    res.status(500).json({ error: 'Failed to fetch book summary' });
+  }
+}
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized cleaning stage against the per-element functions it replaced.
+
+Builds a synthetic enriched frame (scraped rating text, thousand-separated
+counts, "12 editions", numbers and blanks mixed together), cleans it with the
+original row-wise `.apply` functions and with cleaning.py, checks that both
+agree wherever the old code produced a value, and prints the timings.
+
+    python scripts/benchmarks/bench_cleaning.py --rows 100000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from cleaning import ARROW_BACKEND, clean_counts, clean_ratings  # noqa: E402
+
+
+# The per-element cleaning previously used by update_database.py, kept as the baseline
+def parse_goodreads_rating(x):
+    if isinstance(x, str):
+        cleaned = x.replace("really liked it", "").strip()
+        match = re.search(r"([\d]+\.[\d]+)", cleaned)
+        return float(match.group(1)) if match else None
+    return x
+
+
+def clean_number(x):
+    if pd.isna(x):
+        return None
+    if isinstance(x, str):
+        return int(x.replace(',', '').replace(" editions", ""))
+    return x
+
+
+def legacy_clean(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df['Goodreads Rating'] = df['Goodreads Rating'].apply(parse_goodreads_rating)
+    df['Rating'] = pd.to_numeric(df['Rating'], errors='coerce')
+    df['Ratings gap'] = df['Rating'].astype('float') - df['Goodreads Rating'].astype('float')
+    df['Ratings trend'] = np.where(df['Rating'] > df['Goodreads Rating'], 'Over', 'Under')
+    df = df.fillna(0)
+    for col in ['num_ratings', 'num_editions']:
+        df[col] = df[col].apply(clean_number)
+    return df
+
+
+def vectorized_clean(df: pd.DataFrame) -> pd.DataFrame:
+    return clean_counts(clean_ratings(df))
+
+
+def synthetic_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    ratings = rng.uniform(3.0, 4.8, rows).round(2)
+    counts = rng.integers(10, 3_000_000, rows)
+    editions = rng.integers(1, 400, rows)
+
+    rating_text = np.where(
+        rng.random(rows) < 0.5,
+        [f"really liked it {r:.2f} avg rating — {c:,} ratings" for r, c in zip(ratings, counts)],
+        [f"{r:.2f} avg rating — {c:,} ratings" for r, c in zip(ratings, counts)],
+    ).astype(object)
+    rating_text[rng.random(rows) < 0.05] = None
+
+    count_text = np.array([f"{c:,}" for c in counts], dtype=object)
+    already_numeric = rng.random(rows) < 0.2
+    count_text[already_numeric] = counts[already_numeric].tolist()
+    edition_text = np.array([f"{e} editions" for e in editions], dtype=object)
+    edition_text[rng.random(rows) < 0.05] = None
+
+    user_rating = rng.integers(1, 6, rows).astype(object)
+    user_rating[rng.random(rows) < 0.05] = ""
+
+    return pd.DataFrame({
+        'Title': [f"Book {i}" for i in range(rows)],
+        'Rating': user_rating,
+        'Goodreads Rating': rating_text,
+        'num_ratings': count_text,
+        'num_editions': edition_text,
+    })
+
+
+def best_time(func, df: pd.DataFrame, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_agreement(legacy: pd.DataFrame, vectorized: pd.DataFrame):
+    """Vectorized output must match the old output wherever the old one was not a filled-in 0"""
+    for col in ['Goodreads Rating', 'Rating', 'num_ratings', 'num_editions', 'Ratings gap']:
+        new = vectorized[col].astype('Float64')
+        present = new.notna().to_numpy(dtype=bool)
+        old = pd.to_numeric(legacy[col], errors='coerce').to_numpy(dtype=float)
+        if not np.allclose(old[present], new[present].to_numpy(dtype=float)):
+            sys.exit(f"Column {col!r} differs between legacy and vectorized cleaning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per implementation (best time is reported)")
+    args = parser.parse_args()
+
+    df = synthetic_frame(args.rows)
+    check_agreement(legacy_clean(df), vectorized_clean(df))
+
+    legacy_s = best_time(legacy_clean, df, args.repeat)
+    vectorized_s = best_time(vectorized_clean, df, args.repeat)
+    print(f"{args.rows:,} rows (arrow backend: {ARROW_BACKEND})")
+    print(f"  per-element .apply: {legacy_s * 1000:>9.1f} ms")
+    print(f"  vectorized:         {vectorized_s * 1000:>9.1f} ms")
+    print(f"  speedup:            {legacy_s / vectorized_s:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark the LSH near-duplicate detector against all-pairs comparison.
+
+Builds a book list where some titles reappear in another store's formatting
+(title-cased slugs, dropped articles and punctuation, a typo, a missing
+author), finds the duplicates once by comparing every pair with the same
+similarity test and once through dedup.NearDuplicateIndex, and prints the
+timings, comparisons made and how many of the all-pairs duplicates LSH found.
+
+    python scripts/benchmarks/bench_dedup.py --books 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from book_keys import normalize_text, normalize_title  # noqa: E402
+from dedup import AUTHOR_THRESHOLD, TITLE_THRESHOLD, NearDuplicateIndex, jaccard, shingles, title_numbers  # noqa: E402
+
+WORDS = ("river night garden house winter salt glass empire daughter silence orchard memory fire "
+         "stranger harbor letters summer island mirror kingdom paper bright wild city secret").split()
+
+
+def variant(title: str, author: str, rng) -> tuple:
+    """The same book as another store might list it"""
+    choice = rng.integers(0, 4)
+    if choice == 0:  # Books & Books slug: title-cased, punctuation gone
+        return title.replace(":", "").replace(",", "").title(), author.title()
+    if choice == 1:  # Leading article dropped, subtitle punctuation changed
+        return title.removeprefix("The ").replace(":", " -"), author
+    if choice == 2:  # One-letter typo in a long word
+        words = title.split()
+        longest = max(range(len(words)), key=lambda i: len(words[i]))
+        words[longest] = words[longest][:-2] + words[longest][-1]
+        return " ".join(words), author
+    return title.upper(), ""  # Author unknown yet
+
+
+def synthetic_books(count: int, duplicate_share: float = 0.2, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    books = []
+    while len(books) < count:
+        words = rng.choice(WORDS, rng.integers(2, 5), replace=False)
+        title = " ".join(words).capitalize()
+        if rng.random() < 0.3:
+            title = f"The {title}"
+        title = f"{title} {rng.integers(1, 10_000)}"  # Keeps unrelated titles apart
+        author = f"Author {rng.integers(0, count // 3 + 1)} Surname"
+        books.append((title, author))
+        if rng.random() < duplicate_share:
+            books.append(variant(title, author, rng))
+    return books[:count]
+
+
+def all_pairs(books: list) -> tuple:
+    titles = [shingles(normalize_title(title)) for title, _ in books]
+    numbers = [title_numbers(normalize_title(title)) for title, _ in books]
+    authors = [shingles(normalize_text(author)) for _, author in books]
+    duplicates = set()
+    comparisons = 0
+    for i in range(len(books)):
+        for j in range(i):
+            comparisons += 1
+            if (jaccard(titles[i], titles[j]) >= TITLE_THRESHOLD and numbers[i] == numbers[j]
+                    and (not authors[i] or not authors[j] or jaccard(authors[i], authors[j]) >= AUTHOR_THRESHOLD)):
+                duplicates.add(i)
+                break
+    return duplicates, comparisons
+
+
+def lsh(books: list) -> tuple:
+    index = NearDuplicateIndex()
+    duplicates = {i for i, (title, author) in enumerate(books) if index.add_unless_duplicate(title, author) is None}
+    return duplicates, index.comparisons
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=2000)
+    args = parser.parse_args()
+
+    books = synthetic_books(args.books)
+    (expected, pair_comparisons), pairs_s = timed(all_pairs, books)
+    (found, lsh_comparisons), lsh_s = timed(lsh, books)
+    false_positives = found - expected
+    if false_positives:
+        sys.exit(f"LSH flagged {len(false_positives)} books that all-pairs comparison does not")
+
+    print(f"{args.books:,} books, {len(expected):,} near-duplicates by all-pairs comparison")
+    print(f"  all pairs: {pairs_s * 1000:>9.1f} ms  {pair_comparisons:>12,} comparisons")
+    print(f"  LSH:       {lsh_s * 1000:>9.1f} ms  {lsh_comparisons:>12,} comparisons")
+    print(f"  speedup:   {pairs_s / lsh_s:>9.1f}x")
+    print(f"  recall:    {len(found) / max(len(expected), 1):>9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Goodreads search-result parser against saved HTML fixtures.
+
+Compares the full-document parse (fast=False) with the early-exit parser
+(fast=True) on every fixtures/goodreads_search_*.html page, checks that both
+return the same book, and prints the per-page time and speedup. Genre
+classification is disabled so no network or OpenAI calls are made.
+
+    python scripts/benchmarks/bench_goodreads_parser.py --repeat 20
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from goodreads import FAST_PARSER, parse_goodreads_search_results  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def time_parse(html: str, fast: bool, repeat: int) -> float:
+    """Best-of-`repeat` wall time of one parse, in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_goodreads_search_results(html, classify=False, fast=fast)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="runs per page (best time is reported)")
+    parser.add_argument("--fixtures", default=os.path.join(FIXTURES_DIR, "goodreads_search_*.html"))
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.fixtures))
+    if not paths:
+        sys.exit(f"No fixtures match {args.fixtures}")
+
+    print(f"Fast parser backend: {FAST_PARSER}")
+    print(f"{'fixture':<45} {'KiB':>6} {'full ms':>9} {'fast ms':>9} {'speedup':>8}")
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+
+        full = parse_goodreads_search_results(html, classify=False, fast=False)
+        fast = parse_goodreads_search_results(html, classify=False, fast=True)
+        if full != fast:
+            sys.exit(f"{os.path.basename(path)}: fast parser output differs\n  full={full}\n  fast={fast}")
+
+        full_ms = time_parse(html, fast=False, repeat=args.repeat)
+        fast_ms = time_parse(html, fast=True, repeat=args.repeat)
+        print(f"{os.path.basename(path):<45} {len(html) / 1024:>6.0f} {full_ms:>9.2f} {fast_ms:>9.2f} "
+              f"{full_ms / fast_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark of the three HTML parsers: Goodreads search, Strand and Books & Books.
+
+Every fixtures/*.html page is parsed repeatedly to report the best per-page
+parse time, the peak memory of one parse (tracemalloc) and the number of
+books found. Then a local stub server (stubs.StubServer) serves the same
+pages under the real sites' paths, and the fetch + parse code paths used by
+the pipeline (fetch_goodreads_search_results, staff_picks.scrape_store) are
+driven against it to measure end-to-end pages per second. OpenAI is stubbed
+in-process, so --classify exercises the genre and rating fallbacks without
+any network call.
+
+Results can be saved as a baseline and later runs compared against it; the
+script exits non-zero when a page got slower than --max-regression allows.
+
+    python scripts/benchmarks/bench_parsers.py --save-baseline /tmp/parsers.json
+    python scripts/benchmarks/bench_parsers.py --baseline /tmp/parsers.json --max-regression 0.25
+"""
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bs4 import BeautifulSoup
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import goodreads  # noqa: E402
+import staff_picks  # noqa: E402
+from genre_classifier import get_genre_classifier  # noqa: E402
+from rate_limit import HostRateLimiter, host_of  # noqa: E402
+from stubs import FIXTURES_DIR, STAFF_PICK_FIXTURES, STUB_RATING, StubOpenAI, StubServer, read_fixture  # noqa: E402
+
+STUB_API_KEY = "stub-openai-key"
+
+
+def goodreads_parser(classify: bool):
+    def parse(html: bytes):
+        return goodreads.parse_goodreads_search_results(html.decode("utf-8"), classify=classify)
+    return parse
+
+
+def staff_pick_parser(store: str):
+    scraper = staff_picks.SCRAPERS[store]
+
+    def parse(html: bytes):
+        # As in staff_picks.scrape_store, soup construction included
+        return scraper.parse(BeautifulSoup(html, "html.parser"), scraper.base_url)
+    return parse
+
+
+def fixtures_by_parser(classify: bool) -> dict:
+    """Parser name -> (parse function, fixture file names)"""
+    pages = {
+        'goodreads': (goodreads_parser(classify), sorted(
+            name for name in os.listdir(FIXTURES_DIR) if name.startswith("goodreads_search_"))),
+    }
+    for path, name in STAFF_PICK_FIXTURES.items():
+        store = next(store for store, scraper in staff_picks.SCRAPERS.items() if scraper.url.endswith(path))
+        pages[staff_picks.clean_title(store).lower().replace(" & ", "_and_")] = (staff_pick_parser(store), [name])
+    return pages
+
+
+def install_openai_stub(cache_dir: str) -> StubOpenAI:
+    """Route genre classification and the rating fallback to an in-process stub"""
+    stub = StubOpenAI()
+    os.environ["OPENAI_API_KEY"] = STUB_API_KEY
+    get_genre_classifier(STUB_API_KEY, os.path.join(cache_dir, "enrichment.sqlite3"), client=stub)
+
+    def rating_fallback(context: str):
+        response = stub.chat.completions.create(model="stub", messages=[{"role": "user", "content": context}])
+        return float(response.choices[0].message.content)
+    goodreads.rating_extractor.llm_fallback = rating_fallback
+    return stub
+
+
+def best_ms(parse, html: bytes, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(html)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def peak_kib(parse, html: bytes) -> float:
+    tracemalloc.start()
+    try:
+        parse(html)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_pages(pages: dict, repeat: int) -> dict:
+    results = {}
+    print(f"{'parser':<16} {'fixture':<42} {'KiB':>6} {'books':>6} {'best ms':>9} {'peak KiB':>9}")
+    for parser_name, (parse, names) in pages.items():
+        for name in names:
+            html = read_fixture(name)
+            books = len(parse(html))
+            if not books:
+                sys.exit(f"{parser_name}: no books parsed from {name}")
+            ms = best_ms(parse, html, repeat)
+            kib = peak_kib(parse, html)
+            results[f"{parser_name}/{name}"] = {'best_ms': round(ms, 3), 'peak_kib': round(kib, 1), 'books': books}
+            print(f"{parser_name:<16} {name:<42} {len(html) / 1024:>6.0f} {books:>6} {ms:>9.2f} {kib:>9.0f}")
+    return results
+
+
+def bench_end_to_end(pages: int, workers: int, latency: float, classify: bool) -> dict:
+    """Fetch + parse through the stub server with the pipeline's own request code"""
+    limiter = HostRateLimiter()
+    session = requests.Session()
+    results = {}
+    with StubServer(latency=latency) as server:
+        # Explicit, so the production per-host rates the fetchers ask for do not apply to the stub
+        limiter.set_rate(host_of(server.url), 10_000, burst=workers)
+        queries = [name[len("goodreads_search_"):-len(".html")].replace("_", " ")
+                   for name in os.listdir(FIXTURES_DIR) if name.startswith("goodreads_search_")]
+
+        def search(i: int):
+            html = goodreads.fetch_goodreads_search_results(queries[i % len(queries)], limiter=limiter,
+                                                            base_url=server.url)
+            return goodreads.parse_goodreads_search_results(html, classify=classify)
+
+        stores = [dataclasses.replace(scraper, url=server.url + path)
+                  for path in STAFF_PICK_FIXTURES
+                  for scraper in staff_picks.SCRAPERS.values() if scraper.url.endswith(path)]
+
+        def scrape(i: int):
+            return staff_picks.scrape_store(stores[i % len(stores)], session, limiter)
+
+        for name, job in (('goodreads', search), ('staff_picks', scrape)):
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                books = sum(len(found) for found in executor.map(job, range(pages)))
+            seconds = time.perf_counter() - start
+            results[name] = {'pages_per_second': round(pages / seconds, 1), 'books': books}
+            print(f"  {name:<12} {pages} pages in {seconds * 1000:>8.1f} ms  "
+                  f"{pages / seconds:>8.1f} pages/s  {books} books")
+        print(f"  stub server requests: {server.requests}")
+    return results
+
+
+def check_regressions(results: dict, baseline_path: str, max_regression: float) -> list:
+    with open(baseline_path) as f:
+        baseline = json.load(f)['pages']
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before and result['best_ms'] > before['best_ms'] * (1 + max_regression):
+            regressions.append(f"{key}: {before['best_ms']:.2f} ms -> {result['best_ms']:.2f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="parses per page (best time is reported)")
+    parser.add_argument("--pages", type=int, default=60, help="pages fetched per end-to-end run")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent fetches, as ENRICHMENT_WORKERS")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub server adds per response")
+    parser.add_argument("--classify", action="store_true", help="include stubbed OpenAI genre classification")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write the results as a baseline")
+    parser.add_argument("--baseline", metavar="PATH", help="compare per-page parse times with a saved baseline")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        stub = install_openai_stub(cache_dir)
+        print(f"Fast parser backend: {goodreads.FAST_PARSER}")
+        pages = bench_pages(fixtures_by_parser(args.classify), args.repeat)
+        print(f"End to end through the stub server ({args.workers} workers, {args.latency * 1000:.0f} ms latency)")
+        end_to_end = bench_end_to_end(args.pages, args.workers, args.latency, args.classify)
+        print(f"Stubbed OpenAI calls: {stub.calls} (stub rating {STUB_RATING})")
+
+    results = {'pages': pages, 'end_to_end': end_to_end}
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    if args.baseline:
+        regressions = check_regressions(pages, args.baseline, args.max_regression)
+        if regressions:
+            sys.exit("Parse time regressions:\n  " + "\n  ".join(regressions))
+        print(f"No page slower than the baseline by more than {args.max_regression:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Benchmark the recommendation engine's profile build and candidate scoring.
+
+Builds a reading history with repeated books, favorite authors, blank and
+'nan' cells, then compares IntelligentRecommendationEngine's groupby-based
+profile with the original iterrows() implementation, and its batch scorer
+with the original one-book-at-a-time scorer plus full sort (both kept below
+as baselines). Checks that each pair agrees and prints the timings.
+
+    python scripts/benchmarks/bench_recommendation.py --rows 50000 --candidates 20000
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from update_database import IntelligentRecommendationEngine, RecommendationBook, UserProfile  # noqa: E402
+
+GENRES = ["Literary Fiction", "Science Fiction", "Fantasy", "Mystery", "History", "Memoir", "nan", ""]
+SOURCES = ["Friend", "NYT Review", "Staff Picks", "Podcast", "Book club", "nan", ""]
+
+
+def legacy_build_user_profile(df: pd.DataFrame) -> UserProfile:
+    """The row-by-row profile build previously used by IntelligentRecommendationEngine"""
+    profile = UserProfile()
+    user_ratings = []
+    goodreads_ratings = []
+    genre_scores = defaultdict(list)
+    source_scores = defaultdict(list)
+
+    for _, row in df.iterrows():
+        title = str(row.get('Title', '')).strip()
+        author = str(row.get('Author', '')).strip()
+        if not title or not author or title == 'nan' or author == 'nan':
+            continue
+        try:
+            user_rating = float(row.get('Rating', 0))
+        except (ValueError, TypeError):
+            user_rating = 0
+        try:
+            goodreads_rating = float(row.get('Goodreads Rating', 0))
+        except (ValueError, TypeError):
+            goodreads_rating = 0
+        source = str(row.get('Source', '')).strip()
+        genre = str(row.get('genres', '')).strip()
+
+        book_key = f"{title.lower()}|||{author.lower()}"
+        profile.read_books.add(book_key)
+        profile.user_ratings[book_key] = {
+            'user_rating': user_rating, 'goodreads_rating': goodreads_rating,
+            'source': source, 'genre': genre, 'title': title, 'author': author
+        }
+        if user_rating > 0:
+            user_ratings.append(user_rating)
+        if goodreads_rating > 0:
+            goodreads_ratings.append(goodreads_rating)
+        if user_rating >= 4.0 and author.lower() not in [a.lower() for a in profile.favorite_authors]:
+            profile.favorite_authors.append(author)
+        if genre and user_rating > 0 and genre != 'nan':
+            genre_scores[genre.lower()].append(user_rating)
+        if source and user_rating > 0 and source != 'nan':
+            source_scores[source].append(user_rating)
+
+    if user_ratings:
+        profile.average_user_rating = statistics.mean(user_ratings)
+    if goodreads_ratings:
+        profile.average_goodreads_rating = statistics.mean(goodreads_ratings)
+    if user_ratings and goodreads_ratings and len(user_ratings) == len(goodreads_ratings):
+        profile.rating_bias = profile.average_user_rating - profile.average_goodreads_rating
+    for genre, ratings in genre_scores.items():
+        if len(ratings) >= 2:
+            profile.genre_preferences[genre] = statistics.mean(ratings)
+    for source, ratings in source_scores.items():
+        if len(ratings) >= 2:
+            profile.source_performance[source] = statistics.mean(ratings)
+    return profile
+
+
+def legacy_score_book(engine: IntelligentRecommendationEngine, book: RecommendationBook) -> float:
+    """The per-book scorer previously used by IntelligentRecommendationEngine"""
+    scores = {}
+    rating = book.goodreads_rating or 3.5
+    scores['goodreads_quality'] = min(rating / 5.0, 1.0)
+    predicted_user_rating = max(1.0, min(5.0, rating + engine.user_profile.rating_bias))
+    scores['user_taste_alignment'] = predicted_user_rating / 5.0
+    if book.author.lower() in [a.lower() for a in engine.user_profile.favorite_authors]:
+        scores['favorite_author_boost'] = 1.0
+    else:
+        scores['favorite_author_boost'] = 0.3
+    scores['genre_preference'] = 0.5
+    source_score = 0.5
+    if book.source and engine.user_profile.source_performance:
+        for user_source, avg_rating in engine.user_profile.source_performance.items():
+            if user_source.lower() in book.source.lower():
+                source_score = avg_rating / 5.0
+                break
+    scores['source_reliability'] = source_score
+    scores['popularity_balance'] = 0.5
+    return sum(scores[factor] * engine.weights[factor] for factor in scores)
+
+
+def legacy_top(engine: IntelligentRecommendationEngine, books: list, top_k: int) -> list:
+    scored = [(legacy_score_book(engine, book), book) for book in books]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored[:top_k]
+
+
+def synthetic_candidates(history: pd.DataFrame, count: int, seed: int = 1) -> list:
+    rng = np.random.default_rng(seed)
+    authors = history['Author'].to_numpy()
+    sources = ["Staff Picks", "Strand Staff Picks", "Books & Books", "NYT Review list"]
+    return [
+        RecommendationBook(
+            title=f"Candidate {i}",
+            author=str(authors[rng.integers(0, len(authors))]) if rng.random() < 0.3 else f"New Author {i}",
+            source=sources[rng.integers(0, len(sources))],
+            goodreads_rating=round(float(rng.uniform(3.0, 4.8)), 2) if rng.random() < 0.9 else 0.0,
+        )
+        for i in range(count)
+    ]
+
+
+def synthetic_history(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    authors = np.array([f"Author {i}" for i in range(max(rows // 8, 1))], dtype=object)
+    author = authors[rng.integers(0, len(authors), rows)]
+    # Some authors are spelled with different case, which must still dedupe
+    shouted = rng.random(rows) < 0.1
+    author[shouted] = [a.upper() for a in author[shouted]]
+    title = np.array([f"Book {i}" for i in rng.integers(0, int(rows * 0.9), rows)], dtype=object)
+    title[rng.random(rows) < 0.01] = "nan"
+
+    rating = rng.integers(1, 6, rows).astype(float)
+    rating[rng.random(rows) < 0.05] = np.nan
+    goodreads = rng.uniform(3.0, 4.8, rows).round(2)
+    goodreads[rng.random(rows) < 0.05] = np.nan
+
+    return pd.DataFrame({
+        'Title': title,
+        'Author': author,
+        'Rating': pd.array(rating, dtype='Float64'),
+        'Goodreads Rating': pd.array(goodreads, dtype='Float64'),
+        'Source': np.array(SOURCES, dtype=object)[rng.integers(0, len(SOURCES), rows)],
+        'genres': np.array(GENRES, dtype=object)[rng.integers(0, len(GENRES), rows)],
+    })
+
+
+def profiles_match(old: UserProfile, new: UserProfile) -> bool:
+    def close(a, b):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+    def same_means(a, b):
+        return a.keys() == b.keys() and all(close(a[k], b[k]) for k in a)
+
+    return (
+        old.read_books == new.read_books
+        and old.user_ratings == new.user_ratings
+        and old.favorite_authors == new.favorite_authors
+        and close(old.average_user_rating, new.average_user_rating)
+        and close(old.average_goodreads_rating, new.average_goodreads_rating)
+        and close(old.rating_bias, new.rating_bias)
+        and same_means(old.genre_preferences, new.genre_preferences)
+        and same_means(old.source_performance, new.source_performance)
+    )
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--candidates", type=int, default=20_000)
+    parser.add_argument("--top-k", type=int, default=4)
+    args = parser.parse_args()
+
+    df = synthetic_history(args.rows)
+    # Missing ratings are 0 in the profile, as in the old float(pd.NA) -> TypeError path
+    legacy_df = df.astype({'Rating': object, 'Goodreads Rating': object}).fillna(0)
+
+    legacy, legacy_s = timed(legacy_build_user_profile, legacy_df)
+    engine, vectorized_s = timed(IntelligentRecommendationEngine, df)
+    if not profiles_match(legacy, engine.user_profile):
+        sys.exit("Vectorized user profile differs from the iterrows() build")
+
+    print(f"User profile for {args.rows:,} rows ({len(legacy.read_books):,} distinct books)")
+    print(f"  iterrows():  {legacy_s * 1000:>9.1f} ms")
+    print(f"  groupby:     {vectorized_s * 1000:>9.1f} ms")
+    print(f"  speedup:     {legacy_s / vectorized_s:>9.1f}x")
+
+    candidates = synthetic_candidates(df, args.candidates)
+    expected, legacy_s = timed(legacy_top, engine, candidates, args.top_k)
+    top, batch_s = timed(engine.score_candidates, candidates, args.top_k)
+    # Compare scores rather than titles: candidates tie often and the summation order differs
+    if not all(math.isclose(score, book.recommendation_score) and
+               math.isclose(legacy_score_book(engine, book), book.recommendation_score)
+               for (score, _), book in zip(expected, top)):
+        sys.exit("Batch scorer's top K differs from the per-book scorer")
+
+    print(f"Scoring {args.candidates:,} candidates, top {args.top_k}")
+    print(f"  per book + sort:   {legacy_s * 1000:>9.1f} ms")
+    print(f"  batch + partition: {batch_s * 1000:>9.1f} ms")
+    print(f"  speedup:           {legacy_s / batch_s:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
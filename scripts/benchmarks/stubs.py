@@ -0,0 +1,182 @@
+"""
+Network stand-ins for the benchmarks: a local HTTP server and an OpenAI client.
+
+StubServer serves the saved HTML fixtures on 127.0.0.1 under the paths the
+real sites use, with ETag / If-None-Match handling and optional added
+latency, so fetch + parse code runs end to end without touching the network.
+It also answers /v1/chat/completions, so OPENAI_BASE_URL can point the real
+OpenAI SDK at it. StubOpenAI is an in-process client with the same
+`chat.completions.create` surface, for code that accepts a client.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Store path -> fixture, as registered in staff_picks.SCRAPERS
+STAFF_PICK_FIXTURES = {
+    "/collections/staff-picks.html": "strand_staff_picks.html",
+    "/staff-selections/": "books_and_books_staff_selections.html",
+}
+
+STUB_GENRE = "literary fiction"
+STUB_RATING = "4.00"
+
+_BOOK_LINE_RE = re.compile(r"^\d+\. Title:", re.MULTILINE)
+
+
+def read_fixture(name: str) -> bytes:
+    with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+        return f.read()
+
+
+def stub_completion(messages: List[Dict], response_format: Optional[Dict] = None) -> str:
+    """
+    Content of a canned chat completion: one STUB_GENRE per numbered book for
+    the batch genre prompt (JSON mode), STUB_RATING for anything else.
+    """
+    if response_format and response_format.get("type") == "json_object":
+        prompt = messages[-1]["content"]
+        books = len(_BOOK_LINE_RE.findall(prompt))
+        return json.dumps({"genres": [{"id": i, "genre": STUB_GENRE} for i in range(books)]})
+    return STUB_RATING
+
+
+def _token_estimate(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubOpenAI:
+    """In-process OpenAI client answering every chat completion from `stub_completion`"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model: str, messages: List[Dict], response_format: Optional[Dict] = None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        content = stub_completion(messages, response_format)
+        prompt = "".join(message["content"] for message in messages)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(prompt_tokens=_token_estimate(prompt), completion_tokens=_token_estimate(content)),
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StubServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "text/html; charset=utf-8"):
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.record(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        if url.path == "/search":
+            query = parse_qs(url.query).get("q", [""])[0]
+            self._send(200, self.server.goodreads_page(query))
+        elif url.path in STAFF_PICK_FIXTURES:
+            self._send(200, read_fixture(STAFF_PICK_FIXTURES[url.path]))
+        else:
+            self._send(404, b"not found")
+
+    def do_POST(self):
+        self.server.record(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if urlparse(self.path).path != "/v1/chat/completions":
+            self._send(404, b"not found")
+            return
+        messages = request.get("messages", [])
+        content = stub_completion(messages, request.get("response_format"))
+        prompt = "".join(message.get("content", "") for message in messages)
+        body = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": _token_estimate(prompt), "completion_tokens": _token_estimate(content),
+                      "total_tokens": _token_estimate(prompt) + _token_estimate(content)},
+        }
+        self._send(200, json.dumps(body).encode("utf-8"), "application/json")
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Fixture server on an ephemeral local port, used as a context manager:
+
+        with StubServer() as server:
+            fetch_goodreads_search_results("dune", base_url=server.url)
+
+    Goodreads searches get the goodreads_search_*.html fixture whose name
+    best matches the query (the first one otherwise); `latency` seconds are
+    added to every response to mimic a remote site.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._search_pages = {
+            os.path.basename(path)[len("goodreads_search_"):-len(".html")]: path
+            for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "goodreads_search_*.html")))
+        }
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path: str):
+        with self._lock:
+            route = urlparse(path).path
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def goodreads_page(self, query: str) -> bytes:
+        words = set(re.findall(r"[a-z0-9]+", query.lower()))
+        name = max(self._search_pages, key=lambda name: len(words & set(name.split("_"))))
+        with open(self._search_pages[name], "rb") as f:
+            return f.read()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
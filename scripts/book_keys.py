@@ -0,0 +1,41 @@
+"""
+Helpers for building stable lookup keys from book titles and authors.
+"""
+import re
+import unicodedata
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Leading articles ignored when matching titles ("The Overstory" == "Overstory")
+_LEADING_ARTICLE_RE = re.compile(r"^(?:the|a|an) (?=\S)")
+
+
+def normalize_text(value) -> str:
+    """Case-fold, strip accents/punctuation and collapse whitespace."""
+    if value is None:
+        return ""
+    text = str(value)
+    if text.lower() == "nan":
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION_RE.sub(" ", text.casefold())
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def title_author_key(title, author="") -> str:
+    """Key used to identify a book independent of formatting differences."""
+    return f"{normalize_text(title)}|||{normalize_text(author)}"
+
+
+def normalize_title(value) -> str:
+    """normalize_text plus a leading 'the', 'a' or 'an' removed"""
+    return _LEADING_ARTICLE_RE.sub("", normalize_text(value))
+
+
+def book_key(title, author="") -> str:
+    """
+    Key used to match the same book across sources: case-folded, without
+    punctuation, accents or a leading article. Stored in books_read_ratings.
+    """
+    return f"{normalize_title(title)}|||{normalize_text(author)}"
@@ -0,0 +1,291 @@
+"""
+Loading the processed reading data into the books_read_ratings table.
+"""
+import hashlib
+import logging
+from io import StringIO
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+
+from book_keys import book_key, title_author_key
+from summaries import SUMMARY_TABLES, build_summaries
+
+logger = logging.getLogger(__name__)
+
+BOOKS_TABLE = "books_read_ratings"
+
+# (DataFrame column, database column, SQL type), in table order
+BOOKS_COLUMNS: List[Tuple[str, str, str]] = [
+    ('Title', 'title', 'VARCHAR(255)'),
+    ('Author', 'author', 'VARCHAR(255)'),
+    ('Type', 'type', 'VARCHAR(255)'),
+    ('Genre', 'genre', 'VARCHAR(255)'),
+    ('Year read', 'year_read', 'INTEGER'),
+    ('Rating', 'rating', 'FLOAT'),
+    ('Source', 'source', 'VARCHAR(255)'),
+    ('Cover_url', 'cover_url', 'TEXT'),
+    ('Goodreads Rating', 'goodreads_rating', 'FLOAT'),
+    ('num_ratings', 'num_ratings', 'INTEGER'),
+    ('num_editions', 'num_editions', 'INTEGER'),
+    ('genres', 'genres', 'TEXT'),
+    ('type', 'type2', 'VARCHAR(255)'),
+    ('Ratings gap', 'ratings_gap', 'FLOAT'),
+    ('Ratings trend', 'ratings_trend', 'VARCHAR(255)'),
+]
+
+# Normalized title + author (see book_keys.book_key), indexed for the already-read anti-join
+DERIVED_COLUMNS: List[Tuple[str, str]] = [
+    ('book_key', 'TEXT NOT NULL'),
+]
+
+# Natural key of a row and a hash of its contents, used by the incremental sync
+FINGERPRINT_COLUMNS: List[Tuple[str, str]] = [
+    ('row_key', 'TEXT PRIMARY KEY'),
+    ('row_hash', 'TEXT NOT NULL'),
+]
+
+COPY_NULL = "\\N"
+
+SYNC_BATCH_SIZE = 500
+
+# Indexes of the books table, named "<table>_<suffix>"
+INDEX_SUFFIXES = ('pkey', 'book_key_idx')
+
+
+def create_table_sql(table: str) -> str:
+    definitions = ([(db_col, sql_type) for _, db_col, sql_type in BOOKS_COLUMNS]
+                   + DERIVED_COLUMNS + FINGERPRINT_COLUMNS)
+    columns = ",\n    ".join(f"{db_col} {sql_type}" for db_col, sql_type in definitions)
+    return f"CREATE TABLE {table} (\n    {columns}\n)"
+
+
+def create_book_key_index_sql(table: str) -> str:
+    return f"CREATE INDEX IF NOT EXISTS {table}_book_key_idx ON {table} (book_key)"
+
+
+def prepare_books_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Select the table columns from the processed frame and coerce them to the SQL types"""
+    frame = pd.DataFrame(index=df.index)
+    for df_col, db_col, sql_type in BOOKS_COLUMNS:
+        series = df[df_col] if df_col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if sql_type == 'INTEGER':
+            frame[db_col] = pd.to_numeric(series, errors='coerce').round().astype('Int64')
+        elif sql_type == 'FLOAT':
+            frame[db_col] = pd.to_numeric(series, errors='coerce')
+        else:
+            # Object first: a nullable string column holds pd.NA, which where(..., None) would keep
+            series = series.astype(object)
+            frame[db_col] = series.where(series.notna(), None).map(lambda v: v if v is None else str(v))
+    frame['book_key'] = [book_key(title, author) for title, author in zip(frame['title'], frame['author'])]
+    return add_row_fingerprints(frame)
+
+
+def add_row_fingerprints(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add a stable natural key (normalized title + author + year read) and a
+    content hash to each prepared row. Repeated keys, e.g. a book re-read in
+    the same year, get an occurrence suffix so keys stay unique.
+    """
+    keys = pd.Series(
+        [f"{title_author_key(title, author)}|||{'' if pd.isna(year) else year}"
+         for title, author, year in zip(frame['title'], frame['author'], frame['year_read'])],
+        index=frame.index,
+    )
+    occurrence = keys.groupby(keys).cumcount()
+    keys = keys.where(occurrence == 0, keys + "#" + (occurrence + 1).astype(str))
+
+    canonical = frame.astype(object).where(frame.notna(), COPY_NULL).astype(str)
+    frame = frame.copy()
+    frame['row_key'] = keys
+    frame['row_hash'] = [
+        hashlib.sha1("\x1f".join(values).encode("utf-8")).hexdigest()
+        for values in canonical.itertuples(index=False, name=None)
+    ]
+    return frame
+
+
+def _frame_records(frame: pd.DataFrame) -> List[tuple]:
+    """Rows as tuples of plain Python values with None for missing cells"""
+    return list(frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None))
+
+
+def copy_swap_books_table(conn, df: pd.DataFrame) -> int:
+    """
+    Replace books_read_ratings with the contents of `df` atomically.
+
+    The rows are streamed into a staging table with a single COPY, then the
+    staging table is renamed over the live one in the same transaction, so
+    readers see either the previous table or the complete new one. The
+    summary tables are rewritten in that transaction too.
+    Returns the number of rows loaded.
+    """
+    frame = prepare_books_frame(df)
+    staging = f"{BOOKS_TABLE}_staging"
+    previous = f"{BOOKS_TABLE}_previous"
+    columns = ", ".join(frame.columns)
+
+    buffer = StringIO()
+    frame.to_csv(buffer, index=False, header=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            cur.execute(create_table_sql(staging))
+            cur.copy_expert(
+                f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                buffer
+            )
+            # Built after the COPY, which is cheaper than maintaining it row by row
+            cur.execute(create_book_key_index_sql(staging))
+            cur.execute(f"DROP TABLE IF EXISTS {previous}")
+            cur.execute(f"ALTER TABLE IF EXISTS {BOOKS_TABLE} RENAME TO {previous}")
+            for suffix in INDEX_SUFFIXES:
+                cur.execute(f"ALTER INDEX IF EXISTS {BOOKS_TABLE}_{suffix} RENAME TO {previous}_{suffix}")
+            cur.execute(f"ALTER TABLE {staging} RENAME TO {BOOKS_TABLE}")
+            # Index names are schema-wide, so the indexes follow the table name
+            for suffix in INDEX_SUFFIXES:
+                cur.execute(f"ALTER INDEX {staging}_{suffix} RENAME TO {BOOKS_TABLE}_{suffix}")
+            cur.execute(f"DROP TABLE IF EXISTS {previous}")
+            write_summary_tables(cur, frame)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logger.info(f"Loaded {len(frame)} rows into {BOOKS_TABLE}")
+    return len(frame)
+
+
+def write_summary_tables(cur, frame: pd.DataFrame) -> Dict[str, int]:
+    """
+    Replace the rows of every summary table (see summaries.py) with the
+    aggregates of the prepared `frame`, on the caller's cursor so they commit
+    together with the books. Returns the number of rows per table.
+    """
+    from psycopg2.extras import execute_values
+
+    counts = {}
+    for table, rows in build_summaries(frame).items():
+        columns, _ = SUMMARY_TABLES[table]
+        definitions = ",\n    ".join(f"{column} {sql_type}" for column, sql_type in columns)
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {table} (\n    {definitions}\n)")
+        # DELETE rather than TRUNCATE: the dashboard keeps reading the old rows until commit
+        cur.execute(f"DELETE FROM {table}")
+        if len(rows):
+            execute_values(cur, f"INSERT INTO {table} ({', '.join(rows.columns)}) VALUES %s",
+                           _frame_records(rows), page_size=SYNC_BATCH_SIZE)
+        counts[table] = len(rows)
+    logger.info(f"Wrote summary tables: {counts}")
+    return counts
+
+
+def _has_current_columns(cur) -> bool:
+    required = [db_col for db_col, _ in DERIVED_COLUMNS + FINGERPRINT_COLUMNS]
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = %s AND column_name = ANY(%s)
+    """, (BOOKS_TABLE, required))
+    return cur.fetchone()[0] == len(required)
+
+
+def _has_summary_tables(cur) -> bool:
+    cur.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_name = ANY(%s)
+    """, (list(SUMMARY_TABLES),))
+    return cur.fetchone()[0] == len(SUMMARY_TABLES)
+
+
+def sync_books_table(conn, df: pd.DataFrame) -> Dict[str, int]:
+    """
+    Bring books_read_ratings in line with `df` by writing only what changed.
+
+    Row hashes already stored in Postgres are compared with the new frame;
+    new and changed rows are upserted and vanished rows deleted, in batches
+    and inside one transaction. The summary tables are rewritten in the same
+    transaction, but only when a row changed (or they do not exist yet), so
+    an unchanged day writes nothing. Tables created before fingerprints or
+    the book_key column existed are rebuilt once with `copy_swap_books_table`.
+    Returns the number of inserted, updated, deleted and unchanged rows.
+    """
+    from psycopg2.extras import execute_values
+
+    frame = prepare_books_frame(df)
+
+    try:
+        with conn.cursor() as cur:
+            if not _has_current_columns(cur):
+                conn.rollback()
+                logger.info(f"{BOOKS_TABLE} lacks row fingerprints or book keys, rebuilding it")
+                loaded = copy_swap_books_table(conn, df)
+                return {'inserted': loaded, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+            cur.execute(f"SELECT row_key, row_hash FROM {BOOKS_TABLE}")
+            existing = dict(cur.fetchall())
+
+            is_new = ~frame['row_key'].isin(existing.keys())
+            stored_hash = frame['row_key'].map(existing)
+            is_changed = ~is_new & (stored_hash != frame['row_hash'])
+            deleted_keys = list(set(existing) - set(frame['row_key']))
+
+            upserts = frame[is_new | is_changed]
+            if len(upserts):
+                columns = list(frame.columns)
+                assignments = ", ".join(f"{col} = EXCLUDED.{col}" for col in columns if col != 'row_key')
+                execute_values(
+                    cur,
+                    f"INSERT INTO {BOOKS_TABLE} ({', '.join(columns)}) VALUES %s "
+                    f"ON CONFLICT (row_key) DO UPDATE SET {assignments}",
+                    _frame_records(upserts),
+                    page_size=SYNC_BATCH_SIZE,
+                )
+            if deleted_keys:
+                cur.execute(f"DELETE FROM {BOOKS_TABLE} WHERE row_key = ANY(%s)", (deleted_keys,))
+            if len(upserts) or deleted_keys or not _has_summary_tables(cur):
+                write_summary_tables(cur, frame)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    counts = {
+        'inserted': int(is_new.sum()),
+        'updated': int(is_changed.sum()),
+        'deleted': len(deleted_keys),
+        'unchanged': int(len(frame) - is_new.sum() - is_changed.sum()),
+    }
+    logger.info(f"Synced {BOOKS_TABLE}: {counts}")
+    return counts
+
+
+def unread_positions(conn, books: Iterable[Tuple[str, str]]) -> List[int]:
+    """
+    Positions of the (title, author) pairs that are not in books_read_ratings.
+
+    The candidates' book keys go into a temporary table that is anti-joined
+    against the indexed book_key column, so only the unread candidates come
+    back and the cost follows the number of candidates, not the library size.
+    """
+    from psycopg2.extras import execute_values
+
+    rows = [(position, book_key(title, author)) for position, (title, author) in enumerate(books)]
+    if not rows:
+        return []
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS candidate_books (
+                position INTEGER PRIMARY KEY,
+                book_key TEXT NOT NULL
+            ) ON COMMIT DROP
+        """)
+        cur.execute("TRUNCATE candidate_books")  # In case of an earlier call in the same transaction
+        execute_values(cur, "INSERT INTO candidate_books (position, book_key) VALUES %s", rows,
+                       page_size=SYNC_BATCH_SIZE)
+        cur.execute(f"""
+            SELECT c.position FROM candidate_books c
+            WHERE NOT EXISTS (SELECT 1 FROM {BOOKS_TABLE} r WHERE r.book_key = c.book_key)
+            ORDER BY c.position
+        """)
+        return [position for (position,) in cur.fetchall()]
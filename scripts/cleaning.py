@@ -0,0 +1,87 @@
+"""
+Vectorized cleaning of the enriched reading data.
+
+Ratings, rating counts and edition counts arrive as a mix of scraped text
+("4.12 avg rating — 1,234 ratings", "1,234", "12 editions"), numbers and
+blanks. Every cell is read as text and the first number is extracted in one
+pass per column, into nullable dtypes (Float64 / Int64) so missing values stay
+missing instead of becoming 0. The regex work runs in Arrow's C++ kernels when
+pyarrow is installed and falls back to pandas string methods otherwise.
+"""
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+# First number in the cell, e.g. "4.12" in "really liked it 4.12 avg rating — 1,234 ratings"
+RATING_PATTERN = r"(?P<value>\d+(?:\.\d+)?)"
+# First thousand-separated integer, e.g. "1,234" or the "12" in "12 editions"
+COUNT_PATTERN = r"(?P<value>\d[\d,]*)"
+
+COUNT_COLUMNS = ['num_ratings', 'num_editions']
+
+ARROW_BACKEND = pa is not None
+
+
+def _extract_arrow(series: pd.Series, pattern: str, arrow_type) -> pd.Series:
+    text = pa.array(series.astype('string[pyarrow]').array)
+    matches = pc.struct_field(pc.extract_regex(text, pattern), [0])
+    numbers = pc.cast(pc.replace_substring(matches, ",", ""), arrow_type)
+    return pd.Series(numbers.to_numpy(zero_copy_only=False), index=series.index)
+
+
+def _extract_pandas(series: pd.Series, pattern: str) -> pd.Series:
+    matches = series.astype('string').str.extract(pattern, expand=False)
+    return pd.to_numeric(matches.str.replace(",", "", regex=False), errors='coerce')
+
+
+def _extract_number(series: pd.Series, pattern: str, dtype: str) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(series):
+        numbers = series
+    elif ARROW_BACKEND:
+        numbers = _extract_arrow(series, pattern, pa.float64())
+    else:
+        numbers = _extract_pandas(series, pattern)
+    if dtype == 'Int64':
+        numbers = numbers.round()
+    return numbers.astype(dtype)
+
+
+def parse_rating(series: pd.Series) -> pd.Series:
+    """First decimal number in each cell as Float64; numeric columns are kept as they are"""
+    return _extract_number(series, RATING_PATTERN, 'Float64')
+
+
+def parse_count(series: pd.Series) -> pd.Series:
+    """Integer counts from cells like '1,234' or '12 editions' as Int64"""
+    return _extract_number(series, COUNT_PATTERN, 'Int64')
+
+
+def clean_ratings(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parse the user and Goodreads ratings and derive the ratings gap and trend.
+
+    Rows missing either rating get a missing gap and trend rather than 0 and
+    'Under'.
+    """
+    df = df.copy()
+    df['Goodreads Rating'] = parse_rating(df['Goodreads Rating'])
+    df['Rating'] = parse_rating(df['Rating'])
+    df['Ratings gap'] = df['Rating'] - df['Goodreads Rating']
+    trend = pd.Series(pd.NA, index=df.index, dtype='string')
+    trend[df['Ratings gap'] > 0] = 'Over'
+    trend[df['Ratings gap'] <= 0] = 'Under'
+    df['Ratings trend'] = trend
+    return df
+
+
+def clean_counts(df: pd.DataFrame, columns=COUNT_COLUMNS) -> pd.DataFrame:
+    """Parse thousand-separated count columns into nullable integers"""
+    df = df.copy()
+    for col in columns:
+        if col in df.columns:
+            df[col] = parse_count(df[col])
+    return df
@@ -0,0 +1,154 @@
+"""
+One managed Postgres session shared by every pipeline stage.
+
+Connections are opened lazily with consistent sslmode handling, reused across
+stages (or drawn from a small pool for threaded callers), and every round trip
+is timed so a run can report how many connections it opened and how long it
+spent in the database.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_sslmode(sslmode: Optional[str] = None) -> Optional[str]:
+    """Explicit value, then PGSSLMODE, then 'require' in production; None leaves libpq's default"""
+    if sslmode:
+        return sslmode
+    if os.getenv("PGSSLMODE"):
+        return os.getenv("PGSSLMODE")
+    if os.getenv("ENV") == "production":
+        return "require"
+    return None
+
+
+class DatabaseSession:
+    """Lazily connected, instrumented psycopg2 session with optional pooling"""
+
+    def __init__(self, dsn: str, sslmode: Optional[str] = None, pool_size: int = 1):
+        self.dsn = dsn
+        self.sslmode = resolve_sslmode(sslmode)
+        self.pool_size = max(1, pool_size)
+        self._conn = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+        self.connections_opened = 0
+        self.round_trips = 0
+        self.db_seconds = 0.0
+
+    def _record(self, seconds: float, round_trips: int = 1):
+        with self._lock:
+            self.round_trips += round_trips
+            self.db_seconds += seconds
+
+    def _connect_kwargs(self) -> dict:
+        import psycopg2.extensions
+
+        session = self
+
+        class TimedCursor(psycopg2.extensions.cursor):
+            def execute(self, query, vars=None):
+                start = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    session._record(time.perf_counter() - start)
+
+            def executemany(self, query, vars_list):
+                start = time.perf_counter()
+                try:
+                    return super().executemany(query, vars_list)
+                finally:
+                    session._record(time.perf_counter() - start)
+
+            def copy_expert(self, sql, file, size=8192):
+                start = time.perf_counter()
+                try:
+                    return super().copy_expert(sql, file, size)
+                finally:
+                    session._record(time.perf_counter() - start)
+
+        class CountedConnection(psycopg2.extensions.connection):
+            def __init__(self, *args, **kwargs):
+                start = time.perf_counter()
+                super().__init__(*args, **kwargs)
+                with session._lock:
+                    session.connections_opened += 1
+                    session.db_seconds += time.perf_counter() - start
+
+            def commit(self):
+                start = time.perf_counter()
+                try:
+                    return super().commit()
+                finally:
+                    session._record(time.perf_counter() - start)
+
+        kwargs = {'connection_factory': CountedConnection, 'cursor_factory': TimedCursor}
+        if self.sslmode:
+            kwargs['sslmode'] = self.sslmode
+        return kwargs
+
+    def _acquire(self):
+        import psycopg2
+        import psycopg2.pool
+
+        with self._lock:
+            pool_size, conn, pool = self.pool_size, self._conn, self._pool
+        if pool_size > 1:
+            if pool is None:
+                pool = psycopg2.pool.ThreadedConnectionPool(1, pool_size, self.dsn, **self._connect_kwargs())
+                with self._lock:
+                    self._pool = pool
+            return pool.getconn()
+
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(self.dsn, **self._connect_kwargs())
+            with self._lock:
+                self._conn = conn
+        return conn
+
+    def _release(self, conn):
+        if self._pool is not None:
+            self._pool.putconn(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Yield a connection for one unit of work; commits on success and rolls
+        back on error. The connection stays open for the next stage.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+
+    def report(self) -> str:
+        return (f"Database: {self.connections_opened} connection(s) opened, "
+                f"{self.round_trips} round trips, {self.db_seconds:.2f}s in the database")
+
+    def close(self):
+        with self._lock:
+            conn, pool = self._conn, self._pool
+            self._conn = None
+            self._pool = None
+        if conn is not None and not conn.closed:
+            conn.close()
+        if pool is not None:
+            pool.closeall()
@@ -0,0 +1,183 @@
+"""
+Near-duplicate detection for books that stays close to linear in their number.
+
+Titles are normalized (book_keys.normalize_title) and cut into character
+trigrams. Each title gets a MinHash signature, and locality-sensitive hashing
+splits the signature into bands: only books that share a band bucket are
+compared at all, instead of every pair. A compared pair is a duplicate when
+the trigram Jaccard similarity of the titles reaches the threshold, the
+titles carry the same numbers (so "Book 1" and "Book 2" of a series stay
+apart) and the authors agree (or one of them is unknown).
+"""
+import re
+import zlib
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+from book_keys import normalize_text, normalize_title
+
+T = TypeVar('T')
+
+# Trigram Jaccard similarity from which two titles count as the same book
+TITLE_THRESHOLD = 0.7
+# Authors are compared more loosely: "Powers" vs "Richard Powers", slug spellings
+AUTHOR_THRESHOLD = 0.4
+
+NUM_PERM = 64
+# 16 bands of 4 rows: titles at similarity 0.7 share a bucket with probability ~0.99,
+# unrelated titles (similarity ~0.1) almost never do
+BANDS = 16
+
+_ROMAN_NUMERAL_RE = re.compile(r"^m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3})$")
+_ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100, 'd': 500, 'm': 1000}
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    """Character n-grams of an already normalized string, padded so short words still count"""
+    if not text:
+        return frozenset()
+    padded = f" {text} "
+    if len(padded) <= size:
+        return frozenset([padded])
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+def _roman_value(token: str) -> int:
+    values = [_ROMAN_VALUES[ch] for ch in token]
+    return sum(-value if value < following else value for value, following in zip(values, values[1:] + [0]))
+
+
+def title_numbers(title: str) -> FrozenSet[int]:
+    """Numbers in an already normalized title, digits or roman numerals: 'book ii' and 'book 2' give {2}"""
+    numbers = set()
+    for token in title.split():
+        if token.isdigit():
+            numbers.add(int(token))
+        elif _ROMAN_NUMERAL_RE.match(token):
+            numbers.add(_roman_value(token))
+    return frozenset(numbers)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """MinHash signatures from `num_perm` universal hash functions of 32-bit shingle hashes"""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # a, b < 2**31 and hashes < 2**32 keep a * h + b below 2**64
+        self.a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, grams: Iterable[str]) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64)
+        return ((self.a * hashes + self.b) % _MERSENNE_PRIME & _MAX_HASH).min(axis=1)
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of (title, author) pairs.
+
+    `add` returns each book's position; `query` returns the positions of
+    indexed books that are near-duplicates of a title and author. Both cost
+    one signature plus the few books in the shared buckets.
+    """
+
+    def __init__(self, threshold: float = TITLE_THRESHOLD, author_threshold: float = AUTHOR_THRESHOLD,
+                 num_perm: int = NUM_PERM, bands: int = BANDS):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.author_threshold = author_threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._titles: List[FrozenSet[str]] = []
+        self._numbers: List[FrozenSet[int]] = []
+        self._authors: List[FrozenSet[str]] = []
+        self.comparisons = 0
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def _band_keys(self, title_grams: FrozenSet[str]) -> List[bytes]:
+        signature = self.hasher.signature(title_grams)
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _authors_agree(self, a: FrozenSet[str], b: FrozenSet[str]) -> bool:
+        return not a or not b or jaccard(a, b) >= self.author_threshold
+
+    @staticmethod
+    def _features(title, author) -> Tuple[FrozenSet[str], FrozenSet[int], FrozenSet[str]]:
+        """Title trigrams, title numbers and author trigrams of a book"""
+        normalized = normalize_title(title)
+        return shingles(normalized), title_numbers(normalized), shingles(normalize_text(author))
+
+    def _matches(self, title_grams: FrozenSet[str], numbers: FrozenSet[int], author_grams: FrozenSet[str],
+                 band_keys: List[bytes]) -> List[int]:
+        candidates = set()
+        for buckets, key in zip(self._buckets, band_keys):
+            candidates.update(buckets.get(key, ()))
+        self.comparisons += len(candidates)
+        return sorted(
+            position for position in candidates
+            if numbers == self._numbers[position]
+            and jaccard(title_grams, self._titles[position]) >= self.threshold
+            and self._authors_agree(author_grams, self._authors[position])
+        )
+
+    def _insert(self, title_grams: FrozenSet[str], numbers: FrozenSet[int], author_grams: FrozenSet[str],
+                band_keys: List[bytes]) -> int:
+        position = len(self._titles)
+        self._titles.append(title_grams)
+        self._numbers.append(numbers)
+        self._authors.append(author_grams)
+        for buckets, key in zip(self._buckets, band_keys):
+            buckets.setdefault(key, []).append(position)
+        return position
+
+    def add(self, title, author="") -> int:
+        title_grams, numbers, author_grams = self._features(title, author)
+        band_keys = self._band_keys(title_grams) if title_grams else []
+        return self._insert(title_grams, numbers, author_grams, band_keys)
+
+    def add_many(self, books: Iterable[Tuple[str, str]]):
+        for title, author in books:
+            self.add(title, author)
+
+    def query(self, title, author="") -> List[int]:
+        title_grams, numbers, author_grams = self._features(title, author)
+        if not title_grams:
+            return []
+        return self._matches(title_grams, numbers, author_grams, self._band_keys(title_grams))
+
+    def add_unless_duplicate(self, title, author="") -> Optional[int]:
+        """Index the book and return its position, or None if it near-duplicates an indexed one"""
+        title_grams, numbers, author_grams = self._features(title, author)
+        band_keys = self._band_keys(title_grams) if title_grams else []
+        if title_grams and self._matches(title_grams, numbers, author_grams, band_keys):
+            return None
+        return self._insert(title_grams, numbers, author_grams, band_keys)
+
+
+def deduplicate(items: Iterable[T], key: Callable[[T], Tuple[str, str]], **kwargs) -> List[T]:
+    """Keep the first of every group of near-duplicate items; `key` gives (title, author)"""
+    index = NearDuplicateIndex(**kwargs)
+    return [item for item in items if index.add_unless_duplicate(*key(item)) is not None]
+
+
+def drop_known(items: Iterable[T], known: Iterable[Tuple[str, str]], key: Callable[[T], Tuple[str, str]],
+               **kwargs) -> List[T]:
+    """Items whose (title, author) is not a near-duplicate of any `known` pair"""
+    index = NearDuplicateIndex(**kwargs)
+    index.add_many(known)
+    return [item for item in items if not index.query(*key(item))]
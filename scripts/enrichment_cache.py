@@ -0,0 +1,221 @@
+"""
+Persistent on-disk cache of parsed Goodreads search results and API lookups.
+
+Entries are keyed by normalized title and author and stored in a small SQLite
+database next to the scripts, so the nightly job only has to go back to the
+network for books that are new or whose volatile fields have expired.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from book_keys import title_author_key
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "enrichment.sqlite3")
+
+DAY = 24 * 60 * 60
+
+# Per-field time-to-live in seconds; None means the value never expires.
+# Ratings move slowly but do move, everything else is effectively immutable.
+FIELD_TTLS: Dict[str, Optional[float]] = {
+    'rating': 7 * DAY,
+    'num_ratings': 7 * DAY,
+    'num_editions': 30 * DAY,
+    'title': None,
+    'url': None,
+    'author': None,
+    'cover_image_url': None,
+    'genres': None,
+    'type': None,
+    'raw_genres': None,
+}
+
+# Fields that must be present for an entry to be usable without a refetch
+REQUIRED_FIELDS = ('author', 'rating', 'cover_image_url', 'genres')
+
+# Genre stored when classification failed: the scraped fields are still good,
+# the book only needs classifying again
+UNCLASSIFIED_GENRE = 'Unknown'
+
+# Lookup answers are kept for a month; "no result" answers are retried sooner
+# in case the book was just missing from the index
+LOOKUP_TTL = 30 * DAY
+NEGATIVE_LOOKUP_TTL = 3 * DAY
+
+
+def connect_cache(path: str = DEFAULT_CACHE_PATH) -> sqlite3.Connection:
+    """Open (and create if needed) the SQLite file backing the script caches."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Connections are guarded by the owning object's lock when shared across threads
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+@dataclass
+class CachedEnrichment:
+    """Cached Goodreads fields for one book plus the ones that have expired"""
+    values: Dict[str, object] = field(default_factory=dict)
+    stale_fields: List[str] = field(default_factory=list)
+
+    @property
+    def is_fresh(self) -> bool:
+        return not self.stale_fields
+
+    @property
+    def needs_classification(self) -> bool:
+        return self.values.get('genres') in (None, '', UNCLASSIFIED_GENRE)
+
+
+class EnrichmentCache:
+    """SQLite-backed store of `parse_goodreads_search_results` output"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, field_ttls: Optional[Dict[str, Optional[float]]] = None):
+        self.path = path
+        self.field_ttls = dict(FIELD_TTLS)
+        if field_ttls:
+            self.field_ttls.update(field_ttls)
+        self.conn = connect_cache(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS goodreads_enrichment (
+                cache_key TEXT PRIMARY KEY,
+                title TEXT,
+                author TEXT,
+                fields TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_expired(self, name: str, fetched_at: float, now: float) -> bool:
+        ttl = self.field_ttls.get(name)
+        return ttl is not None and now - fetched_at > ttl
+
+    def get(self, title: str, author: str = "") -> Optional[CachedEnrichment]:
+        """Return the cached entry for a book, or None if it was never fetched"""
+        row = self.conn.execute(
+            "SELECT fields FROM goodreads_enrichment WHERE cache_key = ?",
+            (title_author_key(title, author),)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        now = time.time()
+        stored = json.loads(row[0])
+        entry = CachedEnrichment()
+        for name, item in stored.items():
+            entry.values[name] = item['value']
+            if self._is_expired(name, item['fetched_at'], now):
+                entry.stale_fields.append(name)
+        for name in REQUIRED_FIELDS:
+            if name not in stored:
+                entry.stale_fields.append(name)
+
+        if entry.is_fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return entry
+
+    def put(self, title: str, author: str, book_info: Dict[str, object], fetched_at: Optional[float] = None):
+        """Merge freshly parsed fields into the entry for a book"""
+        fetched_at = fetched_at or time.time()
+        key = title_author_key(title, author)
+        row = self.conn.execute(
+            "SELECT fields FROM goodreads_enrichment WHERE cache_key = ?", (key,)
+        ).fetchone()
+        stored = json.loads(row[0]) if row else {}
+        for name, value in book_info.items():
+            if name in self.field_ttls:
+                stored[name] = {'value': value, 'fetched_at': fetched_at}
+
+        self.conn.execute("""
+            INSERT INTO goodreads_enrichment (cache_key, title, author, fields, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET
+                fields = excluded.fields,
+                updated_at = excluded.updated_at
+        """, (key, title, author, json.dumps(stored), fetched_at))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+@dataclass
+class CachedLookup:
+    """A remembered API answer; `value` is None when the API had no result"""
+    value: object = None
+
+    @property
+    def found(self) -> bool:
+        return self.value is not None
+
+
+class LookupCache:
+    """
+    SQLite-backed cache of JSON-serializable API answers, grouped by namespace.
+
+    Results live for `ttl` seconds and "no result" answers for `negative_ttl`,
+    so repeated misses do not cost a request on every run either.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl: float = LOOKUP_TTL,
+                 negative_ttl: float = NEGATIVE_LOOKUP_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.conn = connect_cache(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS api_lookups (
+                namespace TEXT NOT NULL,
+                lookup_key TEXT NOT NULL,
+                value TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (namespace, lookup_key)
+            )
+        """)
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: str) -> Optional[CachedLookup]:
+        """Return the remembered answer, or None if there is none or it has expired"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value, fetched_at FROM api_lookups WHERE namespace = ? AND lookup_key = ?",
+                (namespace, key)
+            ).fetchone()
+            value, fetched_at = row if row else (None, None)
+            ttl = self.ttl if value is not None else self.negative_ttl
+            if row is None or time.time() - fetched_at > ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return CachedLookup(json.loads(value) if value is not None else None)
+
+    def put(self, namespace: str, key: str, value: object):
+        """Remember an answer; pass None to remember that there was no result"""
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO api_lookups (namespace, lookup_key, value, fetched_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(namespace, lookup_key) DO UPDATE SET
+                    value = excluded.value,
+                    fetched_at = excluded.fetched_at
+            """, (namespace, key, json.dumps(value) if value is not None else None, time.time()))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,201 @@
+"""
+Batched, persistently memoized LLM genre classification.
+
+Many books are sent to the model in one request and the answers are stored in
+the script cache keyed by a hash of (title, author, raw_genres), so each book
+is classified at most once across runs.
+"""
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, List, Optional
+
+from enrichment_cache import DEFAULT_CACHE_PATH, connect_cache
+from run_report import REPORT
+
+GENRE_TAXONOMY = [
+    'coming-of-age',
+    'psychological fiction',
+    'historical fiction',
+    'science fiction',
+    'fantasy',
+    'mystery',
+    'thriller',
+    'romance',
+    'literary fiction',
+    'dystopian',
+    'horror',
+    'memoir',
+    'biography',
+    'political fiction',
+    'satire',
+]
+
+UNKNOWN_GENRE = "Unknown"
+
+
+def book_fingerprint(book_info: Dict) -> str:
+    """Stable hash of the inputs that determine a book's genre"""
+    payload = json.dumps([
+        str(book_info.get('title', '')).strip().lower(),
+        str(book_info.get('author', '')).strip().lower(),
+        sorted(book_info.get('raw_genres') or []),
+    ])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class GenreClassifier:
+    """Classifies books into GENRE_TAXONOMY, many per OpenAI request"""
+
+    def __init__(self, api_key: str, cache_path: str = DEFAULT_CACHE_PATH,
+                 model: str = "gpt-3.5-turbo", batch_size: int = 25, client=None):
+        self.api_key = api_key
+        self.model = model
+        self.batch_size = batch_size
+        # Any OpenAI-compatible client; benchmarks pass a stub so no request leaves the machine
+        self._client = client
+        self._lock = threading.Lock()
+        self.conn = connect_cache(cache_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS genre_classifications (
+                fingerprint TEXT PRIMARY KEY,
+                title TEXT,
+                genre TEXT NOT NULL,
+                classified_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.api_calls = 0
+        self.memo_hits = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    def _lookup(self, fingerprints: List[str]) -> Dict[str, str]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(fingerprints), 500):
+                chunk = fingerprints[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT fingerprint, genre FROM genre_classifications WHERE fingerprint IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def _store(self, entries: List[tuple]):
+        now = time.time()
+        with self._lock:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO genre_classifications (fingerprint, title, genre, classified_at)
+                VALUES (?, ?, ?, ?)
+            """, [(fingerprint, title, genre, now) for fingerprint, title, genre in entries])
+            self.conn.commit()
+
+    def _request_batch(self, books: List[Dict]) -> List[str]:
+        """Send one chat completion for a batch of books and return one genre per book"""
+        lines = []
+        for i, book in enumerate(books):
+            lines.append(
+                f"{i}. Title: {book.get('title', '')} | Author: {book.get('author', '')} | "
+                f"Goodreads genres: {book.get('raw_genres', [])}"
+            )
+
+        prompt = (
+            "For each book below, choose the single most specific and meaningful literary genre.\n"
+            "Choose from these common book genres ONLY:\n"
+            + "\n".join(f"- {genre}" for genre in GENRE_TAXONOMY)
+            + "\n\nBooks:\n" + "\n".join(lines)
+            + '\n\nRespond with JSON of the form {"genres": [{"id": 0, "genre": "fantasy"}, ...]} '
+            "with exactly one entry per book."
+        )
+
+        self.api_calls += 1
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a literary expert who specializes in genre classification. "
+                        "Respond only with JSON."
+                    )
+                },
+                {"role": "user", "content": prompt},
+            ],
+            response_format={"type": "json_object"},
+            temperature=0.3,
+            max_tokens=30 * len(books) + 20,
+        )
+        REPORT.record_openai(self.model, response.usage)
+
+        data = json.loads(response.choices[0].message.content)
+        genres = [UNKNOWN_GENRE] * len(books)
+        for item in data.get("genres", []):
+            try:
+                position = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            genre = str(item.get("genre", "")).strip().lower()
+            if 0 <= position < len(books) and genre in GENRE_TAXONOMY:
+                genres[position] = genre
+        return genres
+
+    def classify_many(self, books: List[Dict]) -> List[str]:
+        """Return one genre per book, calling the API only for books never seen before"""
+        fingerprints = [book_fingerprint(book) for book in books]
+        known = self._lookup(sorted(set(fingerprints)))
+        hits = sum(1 for fingerprint in fingerprints if fingerprint in known)
+        self.memo_hits += hits
+        REPORT.record_cache('genre_classifier', hits, len(fingerprints) - hits)
+
+        # Classify each distinct unseen book once, even if it appears several times
+        missing = {}
+        for fingerprint, book in zip(fingerprints, books):
+            if fingerprint not in known and fingerprint not in missing:
+                missing[fingerprint] = book
+
+        pending = list(missing.items())
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                genres = self._request_batch([book for _, book in batch])
+            except Exception as e:
+                print(f"Error calling OpenAI API: {e}")
+                continue
+
+            to_store = []
+            for (fingerprint, book), genre in zip(batch, genres):
+                if genre != UNKNOWN_GENRE:
+                    known[fingerprint] = genre
+                    to_store.append((fingerprint, book.get('title', ''), genre))
+            self._store(to_store)
+
+        return [known.get(fingerprint, UNKNOWN_GENRE) for fingerprint in fingerprints]
+
+    def classify(self, book_info: Dict) -> str:
+        return self.classify_many([book_info])[0]
+
+    def close(self):
+        self.conn.close()
+
+
+_classifiers: Dict[str, GenreClassifier] = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_genre_classifier(api_key: str, cache_path: Optional[str] = None, client=None) -> GenreClassifier:
+    """
+    Shared classifier per API key so memo hits and counters are pooled for the run.
+    `client` is only used by the call that creates the classifier.
+    """
+    with _classifiers_lock:
+        if api_key not in _classifiers:
+            _classifiers[api_key] = GenreClassifier(api_key, cache_path or DEFAULT_CACHE_PATH, client=client)
+        return _classifiers[api_key]
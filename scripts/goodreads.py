@@ -0,0 +1,355 @@
+"""
+Goodreads search: fetching, parsing and the OpenAI helpers used while parsing.
+
+Kept free of import-time side effects so the parser can be benchmarked and
+reused outside the nightly pipeline.
+"""
+import os
+import re
+import threading
+import urllib.parse
+from typing import Dict, List, Optional, Sequence
+
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+
+from book_keys import normalize_text
+from genre_classifier import get_genre_classifier
+from rate_limit import SHARED_LIMITER, HostRateLimiter, host_of, limited_request
+from rating_extraction import RatingExtractor
+from run_report import REPORT
+
+GOODREADS_BASE_URL = 'https://www.goodreads.com'
+GOODREADS_HOST = 'www.goodreads.com'
+GOODREADS_REQUESTS_PER_SECOND = 0.5
+
+BOOK_ITEMTYPE = 'http://schema.org/Book'
+
+# Fields a lookup returns unless the caller asks for others
+LOOKUP_FIELDS = ('cover_image_url', 'rating', 'num_ratings')
+
+
+def get_primary_genre(book_info: Dict[str, str], api_key: str) -> str:
+    """
+    Determine the most appropriate primary genre based on book information.
+
+    Goes through the shared batch classifier, so a book that was classified
+    on any previous run is answered from the local memo without an API call.
+    """
+    classifier = get_genre_classifier(api_key, os.getenv("ENRICHMENT_CACHE_PATH"))
+    return classifier.classify(book_info)
+
+
+def get_rating_from_openai(context: str) -> float:
+    """
+    Use OpenAI's Chat API to extract a numerical Goodreads rating from a text snippet.
+    Returns the rating as a float if successful, otherwise returns None.
+    """
+    from openai import OpenAI
+
+    # Create client with API key from environment
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    prompt = (
+        "Extract the numerical book rating from the following text. "
+        "Return only the number (as a float), and nothing else.\n\n"
+        f"Text: {context}\n\nRating: "
+    )
+    
+    try:
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are an assistant that extracts numerical values."},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=0,
+            max_tokens=5,
+        )
+        REPORT.record_openai("gpt-3.5-turbo", response.usage)
+        # The response should be something like "4.2"
+        text = response.choices[0].message.content.strip()
+        return float(text)
+    except Exception as e:
+        print(f"Error extracting rating with OpenAI: {e}")
+        return None
+
+
+# Shared so per-tier hit counts cover every parse in the run
+rating_extractor = RatingExtractor(llm_fallback=get_rating_from_openai)
+
+
+def _fast_parser_backend() -> str:
+    """Prefer lxml when it is installed, it is several times faster than html.parser"""
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+
+FAST_PARSER = _fast_parser_backend()
+
+_BOOK_ROW_RE = re.compile(r'<tr\b[^>]*itemtype=["\']http://schema\.org/Book["\'][^>]*>', re.IGNORECASE)
+_TR_TAG_RE = re.compile(r'<(/?)tr\b', re.IGNORECASE)
+
+
+def _first_book_row_html(html: str) -> Optional[str]:
+    """
+    Slice the markup of the first schema.org/Book row out of a search page.
+
+    Only this fragment is handed to the HTML parser, so the navigation,
+    scripts and the remaining results are never tokenized.
+    """
+    start = _BOOK_ROW_RE.search(html)
+    if not start:
+        return None
+
+    depth = 1
+    for tag in _TR_TAG_RE.finditer(html, start.end()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            end = html.find('>', tag.end())
+            return html[start.start():end + 1 if end != -1 else len(html)]
+    return html[start.start():]
+
+
+def _first_book_entries(html) -> List:
+    """Return a one-element list with the first result row, parsing as little as possible"""
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    fragment = _first_book_row_html(html)
+    if fragment is not None:
+        # Wrapped in a table so lxml keeps the <tr>/<td> structure of a bare fragment
+        soup = BeautifulSoup(f'<table>{fragment}</table>', FAST_PARSER)
+        entry = soup.find('tr', attrs={'itemtype': BOOK_ITEMTYPE})
+        if entry is not None:
+            return [entry]
+
+    # Unusual markup: fall back to a restricted parse that only builds book rows
+    strainer = SoupStrainer('tr', attrs={'itemtype': BOOK_ITEMTYPE})
+    soup = BeautifulSoup(html, 'html.parser', parse_only=strainer)
+    entry = soup.find('tr', attrs={'itemtype': BOOK_ITEMTYPE})
+    return [entry] if entry is not None else []
+
+
+def get_higher_res_cover(cover_url):
+    """
+    Transform Goodreads cover URL to get higher resolution version
+    """
+    if not cover_url:
+        return None
+    
+    # Goodreads URLs often have size indicators that can be modified
+    # Example: ._SY75_.jpg -> ._SY475_.jpg or no size indicator for full size
+    
+    # Remove existing size indicators
+    high_res_url = re.sub(r'\._[A-Z0-9]+_\.', '.', cover_url)
+    
+    # Or try to replace with larger size
+    if '._SY75_.' in cover_url:
+        high_res_url = cover_url.replace('._SY75_.', '._SY475_.')
+    elif '._SX50_.' in cover_url:
+        high_res_url = cover_url.replace('._SX50_.', '._SX318_.')
+    
+    return high_res_url
+
+
+def _parse_book_entry(entry, classify: bool) -> Optional[Dict]:
+    """Extract the fields of one search result row"""
+    # Basic metadata extraction
+    book_title_element = entry.find('a', class_='bookTitle')
+    if not book_title_element:
+        return None
+    book_title = book_title_element.get_text(strip=True)
+    book_url = GOODREADS_BASE_URL + book_title_element['href']
+    
+    # Author extraction
+    author_containers = entry.find_all('div', class_='authorName__container')
+    authors = []
+    for container in author_containers:
+        author_element = container.find('a', class_='authorName')
+        if author_element:
+            author_name = author_element.get_text(strip=True)
+            role = container.find('span', class_='role')
+            if role:
+                role_text = role.get_text(strip=True)
+                authors.append(f"{author_name} {role_text}")
+            else:
+                authors.append(author_name)
+    author = ', '.join(authors) if authors else 'Unknown'
+    
+    # Rating extraction: regex, then microdata, then the LLM as a last resort
+    rating_element = entry.find('span', class_='minirating')
+    rating_text = rating_element.get_text(strip=True) if rating_element else None
+    rating, num_ratings = rating_extractor.extract(rating_text, entry)
+
+
+    # Cover URL extraction
+    cover_image_element = entry.find('img', class_='bookCover')
+    cover_image_url = cover_image_element['src'] if cover_image_element else None
+    cover_image_url = get_higher_res_cover(cover_image_url)
+    
+    # Editions extraction
+    editions_element = entry.find('a', class_='greyText', string=lambda x: 'editions' in str(x) if x else False)
+    num_editions = editions_element.get_text(strip=True) if editions_element else None
+
+    # Prepare book info for OpenAI genre classification
+    book_info = {
+        'title': book_title,
+        'author': author,
+        'description': '',  # You might want to fetch this separately if possible
+        'raw_genres': []  # Collect any genre-like text from the page
+    }
+
+    # Collect any potential genre indicators
+    genre_containers = entry.find_all(['div', 'span'], class_=['genre', 'shelf'])
+    for container in genre_containers:
+        links = container.find_all('a')
+        for link in links:
+            genre = link.get_text(strip=True).lower()
+            if genre and genre not in ['fiction', 'non-fiction']:
+                book_info['raw_genres'].append(genre)
+
+    # Use OpenAI to classify the primary genre
+    if classify:
+        primary_genre = get_primary_genre(book_info, os.getenv("OPENAI_API_KEY"))
+        # Determine book type
+        book_type = 'Fiction' if primary_genre != 'Unknown' else 'Unknown'
+    else:
+        primary_genre = None
+        book_type = None
+    
+    return {
+        'title': book_title,
+        'url': book_url,
+        'author': author,
+        'rating': rating,
+        'num_ratings': num_ratings,
+        'num_editions': num_editions,
+        'cover_image_url': cover_image_url,
+        'genres': primary_genre,
+        'type': book_type,
+        'raw_genres': book_info['raw_genres']
+    }
+
+
+def parse_goodreads_search_results(html, classify: bool = True, fast: bool = True):
+    """
+    Parse Goodreads search results with OpenAI genre extraction.
+
+    With classify=False the genre call is skipped: 'genres' and 'type' are
+    left as None and the collected 'raw_genres' are returned so the caller
+    can classify many books in one batch.
+
+    The default fast mode only parses the first book row (the only one that
+    is used); fast=False builds the full document tree as before.
+    """
+    if fast:
+        book_entries = _first_book_entries(html)
+    else:
+        soup = BeautifulSoup(html, 'html.parser')
+        book_entries = soup.find_all('tr', {'itemscope': '', 'itemtype': BOOK_ITEMTYPE})
+    
+    books = []
+    for entry in book_entries[:1]:  # Still only take first result as most relevant
+        try:
+            book = _parse_book_entry(entry, classify)
+            if book:
+                books.append(book)
+        except Exception as e:
+            print(f"Error processing book entry: {e}")
+            continue
+    
+    return books
+
+
+def fetch_goodreads_search_results(query, limiter: Optional[HostRateLimiter] = None,
+                                   base_url: Optional[str] = None):
+    """
+    Fetch search results from Goodreads with proper error handling.
+
+    Requests go through `limiter` (the run-wide shared limiter by default),
+    which paces them and waits out 429 answers instead of giving up.
+    `base_url` replaces GOODREADS_BASE_URL, e.g. with a local stub server.
+    """
+    base_url = base_url or GOODREADS_BASE_URL
+    limiter = limiter or SHARED_LIMITER
+    limiter.setdefault_rate(host_of(base_url), GOODREADS_REQUESTS_PER_SECOND)
+    encoded_query = urllib.parse.quote(query)
+    url = f'{base_url}/search?q={encoded_query}&search_type=books'
+    
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.9',
+        'Accept-Encoding': 'gzip, deflate, br',
+        'Connection': 'keep-alive',
+        'DNT': '1',
+        'Upgrade-Insecure-Requests': '1'
+    }
+    
+    try:
+        response = limited_request('GET', url, limiter=limiter, headers=headers, timeout=12)
+        
+        if response.status_code == 200:
+            return response.text
+        elif response.status_code == 403:
+            print("Access denied. Request was blocked by Goodreads.")
+            return None
+        elif response.status_code == 429:
+            print("Too many requests. Still rate limited after retrying.")
+            return None
+        else:
+            print(f"Request failed with status code: {response.status_code}")
+            return None
+            
+    except requests.exceptions.Timeout:
+        print("Request timed out. Goodreads server took too long to respond.")
+        return None
+    except requests.exceptions.ConnectionError:
+        print("Connection error. Please check your internet connection.")
+        return None
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred while fetching results: {str(e)}")
+        return None
+
+
+class GoodreadsLookup:
+    """
+    Lightweight Goodreads lookups for callers that only need a few fields.
+
+    Search results are parsed without genre classification, so a lookup never
+    calls OpenAI, and each title is fetched at most once per instance: repeat
+    lookups (including failed ones) are answered from the in-memory memo.
+    """
+
+    def __init__(self, limiter: Optional[HostRateLimiter] = None):
+        self.limiter = limiter
+        self._memo: Dict[str, Optional[Dict]] = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.memo_hits = 0
+
+    def _search(self, title: str) -> Optional[Dict]:
+        html = fetch_goodreads_search_results(title, limiter=self.limiter)
+        if not html:
+            return None
+        books = parse_goodreads_search_results(html, classify=False)
+        return books[0] if books else None
+
+    def lookup(self, title: str, fields: Sequence[str] = LOOKUP_FIELDS) -> Dict[str, object]:
+        """Requested fields of the top search result for `title` (None where unknown)"""
+        key = normalize_text(title)
+        with self._lock:
+            known = key in self._memo
+            if known:
+                self.memo_hits += 1
+        if not known:
+            book = self._search(title)
+            with self._lock:
+                self._memo[key] = book
+                self.fetches += 1
+        book = self._memo[key] or {}
+        return {name: book.get(name) for name in fields}
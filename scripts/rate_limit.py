@@ -0,0 +1,210 @@
+"""
+Per-host request pacing shared by every outbound HTTP caller.
+
+Each host gets a token bucket (a steady rate plus a burst allowance) that
+threads and asyncio tasks draw from. A 429/503 answer pauses the host for its
+Retry-After and halves its rate; the rate recovers gradually while requests
+keep succeeding. `limited_request` wraps a requests call with all of this.
+"""
+import asyncio
+import email.utils
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from run_report import REPORT
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean "slow down" rather than "failed"
+THROTTLE_STATUSES = (429, 503)
+
+# Backoff never drops a host below this fraction of its configured rate
+MIN_RATE_FACTOR = 1 / 16
+
+# After a throttle, the rate doubles back towards normal every this many seconds
+RECOVERY_SECONDS = 30.0
+
+
+def host_of(url: str) -> str:
+    """Return the host part of a URL (or the value itself if it is a host)."""
+    return urlparse(url).netloc or url
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date form)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _check_rate(calls_per_second: float, burst: Optional[float] = None):
+    if not calls_per_second > 0:
+        raise ValueError(f"Request rate must be positive, got {calls_per_second}")
+    if burst is not None and not burst > 0:
+        raise ValueError(f"Burst must be positive, got {burst}")
+
+
+@dataclass
+class _Bucket:
+    rate: float
+    burst: float
+    tokens: float
+    updated: float  # refill clock; set into the future while the host is paused
+    factor: float = 1.0
+    recovered_at: float = 0.0
+    throttles: int = 0  # bumped by every throttle, so sleeping callers notice one
+
+    @property
+    def current_rate(self) -> float:
+        return self.rate * self.factor
+
+
+class HostRateLimiter:
+    """
+    Token buckets per host that several threads and event loops can share.
+
+    `calls_per_second` and `burst` are the defaults for hosts without their
+    own entry; `per_host` maps a host to its calls per second.
+    """
+
+    def __init__(self, calls_per_second: float = 1.0, per_host: Optional[Dict[str, float]] = None,
+                 burst: float = 1.0):
+        _check_rate(calls_per_second, burst)
+        self.default_rate = calls_per_second
+        self.default_burst = burst
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+        self.throttled = 0
+        for host, rate in (per_host or {}).items():
+            self.set_rate(host, rate)
+
+    def set_rate(self, host: str, calls_per_second: float, burst: Optional[float] = None):
+        _check_rate(calls_per_second, burst)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            burst = burst if burst is not None else (bucket.burst if bucket else self.default_burst)
+            if bucket is None:
+                self._buckets[host] = _Bucket(calls_per_second, burst, burst, time.monotonic())
+            else:
+                bucket.rate, bucket.burst = calls_per_second, burst
+
+    def setdefault_rate(self, host: str, calls_per_second: float, burst: Optional[float] = None):
+        """Configure `host` unless a caller already did, so explicit settings win"""
+        with self._lock:
+            configured = host in self._buckets
+        if not configured:
+            self.set_rate(host, calls_per_second, burst)
+
+    def _bucket(self, host: str, now: float) -> _Bucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(self.default_rate, self.default_burst, self.default_burst, now)
+        return bucket
+
+    @staticmethod
+    def _refill(bucket: _Bucket, now: float):
+        if bucket.factor < 1.0 and now - bucket.recovered_at >= RECOVERY_SECONDS:
+            bucket.factor = min(1.0, bucket.factor * 2)
+            bucket.recovered_at = now
+        if now > bucket.updated:
+            bucket.tokens = min(bucket.burst, bucket.tokens + (now - bucket.updated) * bucket.current_rate)
+            bucket.updated = now
+
+    def _reserve(self, host: str, seen_throttles: Optional[int] = None) -> Tuple[float, int]:
+        """
+        Take a token for `host` and return how long the caller must wait before
+        using it, with the host's throttle count. A caller back from waiting
+        passes the count it saw: its slot still holds unless a throttle landed
+        meanwhile, in which case it takes a new one behind the pause.
+        """
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(host, now)
+            if seen_throttles is not None and bucket.throttles == seen_throttles:
+                return 0.0, seen_throttles
+            self._refill(bucket, now)
+            # Tokens may go negative: each waiting caller holds its own future slot
+            bucket.tokens -= 1.0
+            paused = bucket.updated - now
+            return paused + max(0.0, -bucket.tokens) / bucket.current_rate, bucket.throttles
+
+    def wait(self, host: str):
+        """Block until the caller may send its next request to `host`"""
+        delay, throttles = self._reserve(host)
+        while delay > 0:
+            time.sleep(delay)
+            delay, throttles = self._reserve(host, throttles)
+
+    async def wait_async(self, host: str):
+        """Asyncio counterpart of `wait`"""
+        delay, throttles = self._reserve(host)
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay, throttles = self._reserve(host, throttles)
+
+    def throttle(self, host: str, retry_after: Optional[float] = None):
+        """Back off after a 429/503: pause the host for `retry_after` and halve its rate"""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(host, now)
+            self._refill(bucket, now)
+            bucket.factor = max(MIN_RATE_FACTOR, bucket.factor / 2)
+            bucket.recovered_at = now
+            pause = retry_after if retry_after is not None else 1.0 / bucket.current_rate
+            # Nothing refills until the pause is over. Slots already handed out are void: their
+            # callers see the new throttle count when they wake and queue again at the lower rate
+            bucket.tokens = 0.0
+            bucket.updated = max(bucket.updated, now + pause)
+            bucket.throttles += 1
+            self.throttled += 1
+        logger.warning(f"Throttled by {host}: pausing {pause:.1f}s, rate now {bucket.current_rate:.3f}/s")
+
+    def rate_of(self, host: str) -> float:
+        with self._lock:
+            return self._bucket(host, time.monotonic()).current_rate
+
+
+# One limiter for the whole run, so every caller of a host shares its budget
+SHARED_LIMITER = HostRateLimiter()
+
+
+def limited_request(method: str, url: str, session: Optional[requests.Session] = None,
+                    limiter: Optional[HostRateLimiter] = None, max_retries: int = 3,
+                    **kwargs) -> requests.Response:
+    """
+    Send a request through the host's token bucket, retrying throttled answers.
+
+    A 429/503 response makes the limiter honor its Retry-After and back off;
+    the request is then retried up to `max_retries` times. The last response
+    is returned either way, so callers keep their own status handling.
+    Every attempt is recorded in the run report.
+    """
+    limiter = limiter or SHARED_LIMITER
+    host = host_of(url)
+    sender = session or requests
+    for attempt in range(max_retries + 1):
+        limiter.wait(host)
+        start = time.perf_counter()
+        try:
+            response = sender.request(method, url, **kwargs)
+        except requests.RequestException:
+            REPORT.record_http(host, None, time.perf_counter() - start)
+            raise
+        REPORT.record_http(host, response.status_code, time.perf_counter() - start)
+        if response.status_code not in THROTTLE_STATUSES or attempt == max_retries:
+            return response
+        limiter.throttle(host, parse_retry_after(response.headers.get('Retry-After')))
+    return response
@@ -0,0 +1,124 @@
+"""
+Tiered extraction of Goodreads average ratings and rating counts.
+
+Compiled regexes for the known minirating formats are tried first, then
+schema.org microdata on the result row, and only then the (slow, paid) LLM
+fallback. Hits are counted per tier so a run can confirm the LLM tier stays
+at or near zero.
+"""
+import re
+import threading
+from collections import Counter
+from typing import Callable, Optional, Tuple
+
+TIER_REGEX = 'regex'
+TIER_MICRODATA = 'microdata'
+TIER_LLM = 'llm'
+TIER_MISS = 'miss'
+
+_NUMBER = r"\d[\d,.\s]*"
+
+# Ordered from most to least specific. Each pattern exposes a `rating` group
+# and optionally a `count` group.
+RATING_PATTERNS = [
+    # "4.12 avg rating — 1,234 ratings", optionally prefixed by "really liked it"
+    re.compile(rf"(?P<rating>\d[.,]\d{{1,2}})\s*avg\.?\s*rating\s*[—–-]+\s*(?P<count>{_NUMBER})\s*ratings?", re.I),
+    # "avg rating 4.12 — 1,234 ratings"
+    re.compile(rf"avg\.?\s*rating:?\s*(?P<rating>\d[.,]\d{{1,2}})\s*[—–-]+\s*(?P<count>{_NUMBER})\s*ratings?", re.I),
+    # Localized variants: "4,12 Durchschnittsbewertung — 1.234 Bewertungen", "4,12 de moyenne — 1 234 notes"
+    re.compile(rf"(?P<rating>\d[.,]\d{{1,2}})\s*(?:durchschnittsbewertung|de moyenne|valoraci[oó]n media|media)\s*[—–-]+\s*(?P<count>{_NUMBER})", re.I),
+    # Rating without a count
+    re.compile(r"(?P<rating>\d[.,]\d{1,2})\s*avg\.?\s*rating", re.I),
+    # Last resort: any plausible x.xx / x,xx number
+    re.compile(r"(?<![\d.,])(?P<rating>[0-5][.,]\d{1,2})(?![\d])"),
+]
+
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        rating = float(value.replace(",", "."))
+    except (AttributeError, ValueError):
+        return None
+    return rating if 0.0 <= rating <= 5.0 else None
+
+
+def _to_count(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    digits = re.sub(r"\D", "", value)
+    return int(digits) if digits else None
+
+
+class RatingExtractor:
+    """Extracts (rating, num_ratings) from a search result, cheapest tier first"""
+
+    def __init__(self, llm_fallback: Optional[Callable[[str], Optional[float]]] = None):
+        self.llm_fallback = llm_fallback
+        self.tier_hits = Counter()
+        self._lock = threading.Lock()
+
+    def _record(self, tier: str):
+        with self._lock:
+            self.tier_hits[tier] += 1
+
+    def from_text(self, rating_text: str) -> Tuple[Optional[float], Optional[int]]:
+        text = rating_text.replace("really liked it", "").strip()
+        for pattern in RATING_PATTERNS:
+            match = pattern.search(text)
+            if not match:
+                continue
+            rating = _to_float(match.group('rating'))
+            if rating is None:
+                continue
+            count = _to_count(match.groupdict().get('count'))
+            return rating, count
+        return None, None
+
+    @staticmethod
+    def from_microdata(entry) -> Tuple[Optional[float], Optional[int]]:
+        if entry is None:
+            return None, None
+
+        def itemprop(name):
+            element = entry.find(attrs={'itemprop': name})
+            if element is None:
+                return None
+            return element.get('content') or element.get_text(strip=True)
+
+        rating = itemprop('ratingValue')
+        count = itemprop('ratingCount') or itemprop('reviewCount')
+        return (_to_float(rating) if rating else None), _to_count(count)
+
+    def extract(self, rating_text: Optional[str], entry=None) -> Tuple[Optional[float], Optional[int]]:
+        """
+        Return (rating, num_ratings) for a search result.
+
+        `rating_text` is the minirating text and `entry` the BeautifulSoup
+        element for the result row (used for the microdata tier).
+        """
+        num_ratings = None
+        if rating_text:
+            rating, num_ratings = self.from_text(rating_text)
+            if rating is not None:
+                self._record(TIER_REGEX)
+                return rating, num_ratings
+
+        rating, count = self.from_microdata(entry)
+        num_ratings = num_ratings if num_ratings is not None else count
+        if rating is not None:
+            self._record(TIER_MICRODATA)
+            return rating, num_ratings
+
+        if rating_text and self.llm_fallback is not None:
+            rating = self.llm_fallback(f"Goodreads info: {rating_text}")
+            if rating is not None:
+                self._record(TIER_LLM)
+                return rating, num_ratings
+
+        self._record(TIER_MISS)
+        return None, num_ratings
+
+    def summary(self) -> str:
+        with self._lock:
+            hits = dict(self.tier_hits)
+        return ", ".join(f"{tier}={hits.get(tier, 0)}" for tier in (TIER_REGEX, TIER_MICRODATA, TIER_LLM, TIER_MISS))
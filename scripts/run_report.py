@@ -0,0 +1,198 @@
+"""
+Instrumentation of one pipeline run, written out as a JSON report.
+
+`REPORT` collects, from wherever the work happens: wall time per stage, HTTP
+requests per host (counts, statuses, latency percentiles), cache hit rates,
+OpenAI requests and token usage, and database round trips. With profiling
+on, each stage also runs under cProfile and tracemalloc, and its hottest
+functions and largest allocations go into the report.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".reports", "run-report.json")
+
+# Entries kept per stage from the profiler and from tracemalloc
+PROFILE_TOP = 25
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    p50, p90, p99 = np.percentile(seconds, [50, 90, 99])
+    return {
+        'p50_ms': round(p50 * 1000, 1),
+        'p90_ms': round(p90 * 1000, 1),
+        'p99_ms': round(p99 * 1000, 1),
+        'max_ms': round(max(seconds) * 1000, 1),
+    }
+
+
+class RunReport:
+    """Thread-safe collector for the measurements of one run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.stages: List[Dict] = []
+        self._http_seconds: Dict[str, List[float]] = {}
+        self._http_statuses: Dict[str, Counter] = {}
+        self.openai: Dict[str, Dict[str, int]] = {}
+        self.caches: Dict[str, Dict[str, int]] = {}
+        self.counters: Counter = Counter()
+        self.database: Dict = {}
+        self._running: List[Dict] = []
+
+    def record_http(self, host: str, status: Optional[int], seconds: float):
+        """One request/response; `status` None for a request that raised"""
+        with self._lock:
+            self._http_seconds.setdefault(host, []).append(seconds)
+            self._http_statuses.setdefault(host, Counter())[str(status) if status else 'error'] += 1
+
+    def record_openai(self, model: str, usage=None):
+        """One chat completion and its `response.usage`"""
+        with self._lock:
+            totals = self.openai.setdefault(model, {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0})
+            totals['calls'] += 1
+            totals['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+            totals['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+
+    def record_cache(self, name: str, hits: int, misses: int):
+        """Totals of a cache; recording the same cache again adds to it"""
+        with self._lock:
+            totals = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+            totals['hits'] += hits
+            totals['misses'] += misses
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_database(self, session):
+        """Round trips, connections and time of a db_session.DatabaseSession"""
+        self.database = {
+            'connections_opened': session.connections_opened,
+            'round_trips': session.round_trips,
+            'seconds': round(session.db_seconds, 3),
+        }
+
+    def fail_stage(self, error: BaseException):
+        """Mark the running stage failed for an error it handled itself and carried on past"""
+        if self._running:
+            entry = self._running[-1]
+            entry['status'] = 'failed'
+            entry.setdefault('errors', []).append(f"{type(error).__name__}: {error}")
+        else:
+            self.count('failures_outside_stages')
+
+    @property
+    def failed(self) -> bool:
+        return any(entry['status'] == 'failed' for entry in self.stages)
+
+    @contextmanager
+    def stage(self, name: str, profile_dir: Optional[str] = None):
+        """
+        Time a stage; with `profile_dir` also profile it, saving the raw
+        cProfile data there as <stage>.prof.
+        """
+        entry = {'name': name, 'status': 'ok'}
+        profiler = cProfile.Profile() if profile_dir else None
+        if profiler is not None:
+            tracemalloc.start()
+            profiler.enable()
+        start = time.perf_counter()
+        self._running.append(entry)
+        try:
+            yield entry
+        except BaseException as e:
+            entry['status'] = 'failed'
+            entry['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self._running.pop()
+            entry['seconds'] = round(time.perf_counter() - start, 3)
+            if profiler is not None:
+                profiler.disable()
+                entry['profile'] = self._profile_summary(name, profiler, profile_dir)
+            self.stages.append(entry)
+            logger.info(f"Stage '{name}' {entry['status']} in {entry['seconds']:.1f}s")
+
+    @staticmethod
+    def _profile_summary(name: str, profiler: cProfile.Profile, profile_dir: str) -> Dict:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.makedirs(profile_dir, exist_ok=True)
+        profile_path = os.path.join(profile_dir, f"{name}.prof")
+        profiler.dump_stats(profile_path)
+
+        stats = pstats.Stats(profiler, stream=io.StringIO()).sort_stats('cumulative')
+        functions = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in stats.stats.items():
+            functions.append({
+                'function': f"{os.path.basename(filename)}:{line}({function})",
+                'calls': calls,
+                'own_seconds': round(own, 4),
+                'cumulative_seconds': round(cumulative, 4),
+            })
+        functions.sort(key=lambda item: item['cumulative_seconds'], reverse=True)
+
+        allocations = [
+            {'line': str(stat.traceback[0]), 'kib': round(stat.size / 1024, 1), 'blocks': stat.count}
+            for stat in snapshot.statistics('lineno')[:PROFILE_TOP]
+        ]
+        return {
+            'cprofile_file': profile_path,
+            'top_functions': functions[:PROFILE_TOP],
+            'memory_peak_mib': round(peak / 2 ** 20, 2),
+            'memory_retained_mib': round(current / 2 ** 20, 2),
+            'top_allocations': allocations,
+        }
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            http = {
+                host: dict(requests=len(seconds), statuses=dict(self._http_statuses[host]),
+                           total_seconds=round(sum(seconds), 3), **_percentiles(seconds))
+                for host, seconds in self._http_seconds.items()
+            }
+            caches = {
+                name: dict(totals, hit_rate=round(totals['hits'] / max(totals['hits'] + totals['misses'], 1), 3))
+                for name, totals in self.caches.items()
+            }
+            openai = {model: dict(totals) for model, totals in self.openai.items()}
+            counters = dict(self.counters)
+        return {
+            'started_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            'wall_seconds': round(time.time() - self.started_at, 3),
+            'stages': self.stages,
+            'http': http,
+            'caches': caches,
+            'openai': openai,
+            'database': self.database,
+            'counters': counters,
+        }
+
+    def write(self, path: Optional[str] = None) -> str:
+        path = path or os.getenv("RUN_REPORT_PATH", DEFAULT_REPORT_PATH)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        return path
+
+
+# One report per process, filled in by every stage and HTTP/OpenAI caller
+REPORT = RunReport()
@@ -0,0 +1,168 @@
+"""
+Diff-based write-back of a DataFrame to a Google Sheets worksheet.
+
+The current worksheet is read once, compared cell by cell with the new frame,
+and only the changed cells are sent in a single values.batchUpdate call. The
+grid is resized only when the frame's shape differs from the sheet's.
+"""
+import logging
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def column_letter(index: int) -> str:
+    """0-based column index to A1 letters (0 -> A, 26 -> AA)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _cell_value(value):
+    """Plain JSON-serializable value for the Sheets API ('' for missing)"""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return ""
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return "" if math.isnan(value) else float(value)
+    return str(value)
+
+
+def frame_to_values(df: pd.DataFrame) -> List[List]:
+    """Header row followed by the data rows, as the Sheets API expects them"""
+    rows = [[str(col) for col in df.columns]]
+    rows.extend([_cell_value(v) for v in row] for row in df.itertuples(index=False, name=None))
+    return rows
+
+
+def _comparable(value):
+    """Normalize a cell so that 4.2, '4.2' and '4.20' compare equal"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 9)
+    text = "" if value is None else str(value)
+    try:
+        number = float(text.replace(",", "")) if text.strip() else None
+    except ValueError:
+        return text
+    return round(number, 9) if number is not None and math.isfinite(number) else text
+
+
+def _effective_value(cell: Dict):
+    effective = cell.get('effectiveValue', {})
+    for key in ('numberValue', 'stringValue', 'boolValue'):
+        if key in effective:
+            return effective[key]
+    return cell.get('formattedValue', "")
+
+
+def _read_sheet(service, spreadsheet_id: str, title: str) -> Optional[Dict]:
+    """Sheet id, grid size and current values of a worksheet in one request (None if missing)"""
+    response = service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        ranges=[f"'{title}'"],
+        includeGridData=True,
+        fields="sheets(properties(sheetId,title,gridProperties(rowCount,columnCount)),"
+               "data(rowData(values(effectiveValue,formattedValue))))",
+    ).execute()
+
+    for sheet in response.get('sheets', []):
+        properties = sheet['properties']
+        if properties.get('title') != title:
+            continue
+        values = []
+        for data in sheet.get('data', []):
+            for row in data.get('rowData', []):
+                values.append([_effective_value(cell) for cell in row.get('values', [])])
+        grid = properties.get('gridProperties', {})
+        return {
+            'sheet_id': properties['sheetId'],
+            'rows': grid.get('rowCount', 0),
+            'columns': grid.get('columnCount', 0),
+            'values': values,
+        }
+    return None
+
+
+def changed_ranges(title: str, old: List[List], new: List[List]) -> List[Dict]:
+    """ValueRanges covering every cell of `new` that differs from `old`, one per run of changed cells"""
+    data = []
+    for r, new_row in enumerate(new):
+        old_row = old[r] if r < len(old) else []
+        c = 0
+        while c < len(new_row):
+            old_value = old_row[c] if c < len(old_row) else ""
+            if _comparable(old_value) == _comparable(new_row[c]):
+                c += 1
+                continue
+            start = c
+            while c < len(new_row):
+                old_value = old_row[c] if c < len(old_row) else ""
+                if _comparable(old_value) == _comparable(new_row[c]):
+                    break
+                c += 1
+            data.append({
+                'range': f"'{title}'!{column_letter(start)}{r + 1}:{column_letter(c - 1)}{r + 1}",
+                'values': [new_row[start:c]],
+            })
+    return data
+
+
+def write_worksheet_diff(service, spreadsheet_id: str, title: str, df: pd.DataFrame) -> Dict[str, int]:
+    """
+    Make worksheet `title` match `df` (with a header row), writing only changed cells.
+
+    `service` is a Sheets v4 client from googleapiclient. Returns the number
+    of changed cells and API write requests made.
+    """
+    new = frame_to_values(df)
+    n_rows, n_cols = len(new), len(new[0])
+    current = _read_sheet(service, spreadsheet_id, title)
+
+    structure_requests = []
+    if current is None:
+        structure_requests.append({'addSheet': {'properties': {
+            'title': title, 'gridProperties': {'rowCount': n_rows, 'columnCount': n_cols}
+        }}})
+        old = []
+    else:
+        old = current['values']
+        if (current['rows'], current['columns']) != (n_rows, n_cols):
+            # Shrinking the grid also drops stale cells outside the new shape
+            structure_requests.append({'updateSheetProperties': {
+                'properties': {
+                    'sheetId': current['sheet_id'],
+                    'gridProperties': {'rowCount': n_rows, 'columnCount': n_cols},
+                },
+                'fields': 'gridProperties(rowCount,columnCount)',
+            }})
+
+    writes = 0
+    if structure_requests:
+        service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id, body={'requests': structure_requests}
+        ).execute()
+        writes += 1
+
+    data = changed_ranges(title, old, new)
+    if data:
+        service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={'valueInputOption': 'RAW', 'data': data},
+        ).execute()
+        writes += 1
+
+    changed_cells = sum(len(item['values'][0]) for item in data)
+    logger.info(f"Worksheet '{title}': {changed_cells} changed cells in {len(data)} ranges, {writes} write requests")
+    return {'changed_cells': changed_cells, 'ranges': len(data), 'write_requests': writes}
@@ -0,0 +1,214 @@
+"""
+Versioned, compressed snapshot of the reading dataset for the dashboard.
+
+The processed books and the current recommendation are serialized to
+canonical JSON, and its SHA-256 becomes the snapshot version: an unchanged
+dataset produces the same version and byte-identical files. Each version is
+written gzip-compressed, brotli-compressed when the brotli package is
+installed, and as Parquet when pyarrow is. A small manifest.json names the
+current version and its files.
+
+The files only exist where the pipeline runs, so `publish_snapshot` also
+stores the compressed bytes in the small reading_snapshots table, from which
+/api/book-snapshot serves them with the version as a strong ETag instead of
+querying the books table.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from books_db import BOOKS_COLUMNS, prepare_books_frame
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import pyarrow  # noqa: F401  (pandas' Parquet engine)
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+
+MANIFEST_NAME = "manifest.json"
+
+SNAPSHOT_TABLE = "reading_snapshots"
+
+# Versions kept next to the current one, for clients still holding an older manifest
+KEEP_VERSIONS = 3
+
+# Recommendation fields, as served by /api/daily-recommendation
+RECOMMENDATION_FIELDS = ['title', 'author', 'source', 'goodreads_rating', 'recommendation_score',
+                         'reasoning', 'cover_url', 'date']
+
+
+def snapshot_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Book columns under the /api/book-ratings names, ordered like it: year read
+    descending, then title (then the row hash, so the order is total).
+
+    Values are coerced to the table's SQL types first, so the version only
+    depends on the data: a frame from the sheet and the same rows read back
+    from Postgres give the same snapshot.
+    """
+    prepared = prepare_books_frame(df).sort_values(
+        ['year_read', 'title', 'row_hash'], ascending=[False, True, True], na_position='last')
+    frame = prepared[[db_col for _, db_col, _ in BOOKS_COLUMNS]]
+    frame.columns = [df_col for df_col, _, _ in BOOKS_COLUMNS]
+    return frame.reset_index(drop=True)
+
+
+def snapshot_records(frame: pd.DataFrame) -> List[Dict]:
+    """Rows of a snapshot frame with None for missing values"""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def _canonical_json(payload: Dict) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+                      default=str).encode("utf-8")
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _prune(directory: str, keep: List[str]):
+    """Remove snapshot files of versions other than `keep`"""
+    for name in os.listdir(directory):
+        if name.startswith("reading-") and not any(name.startswith(f"reading-{version}.") for version in keep):
+            os.remove(os.path.join(directory, name))
+
+
+def _snapshot_dir(directory: Optional[str] = None) -> str:
+    return directory or os.getenv("SNAPSHOT_DIR", DEFAULT_SNAPSHOT_DIR)
+
+
+def write_snapshot(df: pd.DataFrame, recommendation: Optional[Dict] = None,
+                   directory: Optional[str] = None) -> Dict:
+    """
+    Write the snapshot files for `df` and `recommendation` and point the
+    manifest at them. Returns the manifest.
+    """
+    directory = _snapshot_dir(directory)
+    os.makedirs(directory, exist_ok=True)
+
+    if recommendation is not None:
+        recommendation = {field: recommendation.get(field) for field in RECOMMENDATION_FIELDS}
+    frame = snapshot_frame(df)
+    books = snapshot_records(frame)
+    body = _canonical_json({'books': books, 'recommendation': recommendation})
+    digest = hashlib.sha256(body).hexdigest()
+    version = digest[:16]
+
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    previous = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+
+    files = {}
+    # mtime=0 keeps the gzip bytes identical for identical content
+    files['gzip'] = (f"reading-{version}.json.gz", gzip.compress(body, compresslevel=9, mtime=0))
+    if brotli is not None:
+        files['brotli'] = (f"reading-{version}.json.br", brotli.compress(body, quality=11))
+
+    if previous.get('version') == version and all(
+            os.path.exists(os.path.join(directory, name)) for name, _ in files.values()):
+        logger.info(f"Snapshot {version} unchanged")
+        return previous
+
+    for name, data in files.values():
+        _write_atomic(os.path.join(directory, name), data)
+    sizes = {encoding: len(data) for encoding, (_, data) in files.items()}
+    names = {encoding: name for encoding, (name, _) in files.items()}
+
+    if pyarrow is not None:
+        name = f"reading-{version}.parquet"
+        tmp_path = os.path.join(directory, f"{name}.tmp")
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, os.path.join(directory, name))
+        names['parquet'] = name
+        sizes['parquet'] = os.path.getsize(os.path.join(directory, name))
+
+    manifest = {
+        'version': version,
+        'sha256': digest,
+        'generated_at': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        'book_count': len(books),
+        'json_bytes': len(body),
+        'files': names,
+        'sizes': sizes,
+        'previous_versions': [
+            old for old in [previous.get('version')] + previous.get('previous_versions', []) if old and old != version
+        ][:KEEP_VERSIONS],
+    }
+    _write_atomic(manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+    _prune(directory, [version] + manifest['previous_versions'])
+
+    logger.info(f"Wrote snapshot {version}: {len(books)} books, {len(body)} bytes of JSON, {sizes}")
+    return manifest
+
+
+def publish_snapshot(conn, manifest: Dict, directory: Optional[str] = None) -> bool:
+    """
+    Store the compressed files of `manifest` in reading_snapshots, where the
+    web app reads them, keeping the same number of older versions as on disk.
+    Returns False when that version is already the published one.
+    """
+    directory = _snapshot_dir(directory)
+    files = manifest['files']
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {SNAPSHOT_TABLE} (
+                    version TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    book_count INTEGER NOT NULL,
+                    gzip BYTEA NOT NULL,
+                    brotli BYTEA,
+                    published_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            cur.execute(f"SELECT version FROM {SNAPSHOT_TABLE} ORDER BY published_at DESC LIMIT 1")
+            current = cur.fetchone()
+            if current and current[0] == manifest['version']:
+                conn.rollback()
+                logger.info(f"Snapshot {manifest['version']} already published")
+                return False
+
+            def read(encoding: str):
+                if encoding not in files:
+                    return None
+                with open(os.path.join(directory, files[encoding]), "rb") as f:
+                    return f.read()
+
+            # A version seen before (the data changed back) becomes the latest again
+            cur.execute(f"""
+                INSERT INTO {SNAPSHOT_TABLE} (version, sha256, book_count, gzip, brotli)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (version) DO UPDATE SET published_at = now()
+            """, (manifest['version'], manifest['sha256'], manifest['book_count'],
+                  read('gzip'), read('brotli')))
+            cur.execute(f"""
+                DELETE FROM {SNAPSHOT_TABLE} WHERE version NOT IN (
+                    SELECT version FROM {SNAPSHOT_TABLE} ORDER BY published_at DESC LIMIT %s
+                )
+            """, (KEEP_VERSIONS + 1,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logger.info(f"Published snapshot {manifest['version']} to {SNAPSHOT_TABLE}")
+    return True
@@ -0,0 +1,306 @@
+"""
+Bookstore staff-pick scrapers, registered as plugins and run concurrently.
+
+Each store registers a parser for its staff-picks page together with its own
+per-host request rate. `scrape_all` fetches every registered store at the
+same time, so building the candidate pool takes as long as the slowest store
+rather than the sum of all of them.
+
+Pages are fetched with conditional requests (ETag / Last-Modified) and their
+content hash is remembered, so a page that has not changed since the last run
+is neither downloaded nor parsed again: its books, including everything
+enriched onto them afterwards, come from the page cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from enrichment_cache import DEFAULT_CACHE_PATH, connect_cache
+from rate_limit import SHARED_LIMITER, HostRateLimiter, host_of, limited_request
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Book:
+    """Data class for book information"""
+    title: str
+    author: str = ""
+    store_url: str = ""
+    goodreads_rating: float = 0.0
+    num_ratings: int = 0
+    publication_year: int = 0
+    genres: str = ""
+    isbn: str = ""
+    cover_url: str = ""
+    source: str = ""  # Name of the store it was scraped from
+
+
+@dataclass
+class StaffPickScraper:
+    """One bookstore: where its staff picks live and how to parse them"""
+    name: str
+    url: str
+    parse: Callable[[object, str], List[Book]]
+    calls_per_second: float = 0.3  # Respectful scraping
+    timeout: float = 15
+
+    @property
+    def host(self) -> str:
+        return host_of(self.url)
+
+    @property
+    def base_url(self) -> str:
+        parsed = urlparse(self.url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+
+# Registered stores, in the order their books are returned
+SCRAPERS: Dict[str, StaffPickScraper] = {}
+
+
+def register_scraper(name: str, url: str, calls_per_second: float = 0.3):
+    """Decorator registering `parse(soup, base_url) -> List[Book]` as the scraper for a store"""
+    def decorator(parse):
+        SCRAPERS[name] = StaffPickScraper(name=name, url=url, parse=parse, calls_per_second=calls_per_second)
+        return parse
+    return decorator
+
+
+def clean_title(raw_title: str) -> str:
+    """Clean and normalize book titles"""
+    if not raw_title:
+        return ""
+
+    # Remove "by Author" suffixes
+    parts = re.split(r"\s+by\s+", raw_title, flags=re.IGNORECASE, maxsplit=1)
+    cleaned = parts[0].strip()
+
+    # Remove extra whitespace and normalize
+    cleaned = re.sub(r'\s+', ' ', cleaned)
+    return cleaned.title()
+
+
+@register_scraper("Strand", "https://www.strandbooks.com/collections/staff-picks.html")
+def parse_strand(soup, base_url: str) -> List[Book]:
+    """Strand Bookstore staff picks"""
+    books = []
+    for item in soup.select("div.item-wrapper-zyw"):
+        try:
+            # Extract title and URL
+            title_link = item.select_one("a.item-name-LPg[href]")
+            if not title_link:
+                continue
+
+            title = clean_title(title_link.get_text(strip=True))
+            href = title_link["href"].strip()
+
+            if not href.startswith("http"):
+                href = base_url + href
+
+            # Extract author
+            author_el = item.select_one(".item-authors-a24 li")
+            author = author_el.get_text(strip=True) if author_el else ""
+
+            if title:  # Only add if we have a title
+                books.append(Book(title=title, author=author, store_url=href))
+
+        except Exception as e:
+            logger.warning(f"Error processing Strand item: {e}")
+            continue
+    return books
+
+
+@register_scraper("Books & Books", "https://www.booksandbooks.com/staff-selections/")
+def parse_books_and_books(soup, base_url: str) -> List[Book]:
+    """Books & Books staff selections; title and author come from the URL slug"""
+    books = []
+    for h3 in soup.select("h3.book_title > a[href]"):
+        try:
+            raw_href = h3["href"].strip()
+            if not raw_href:
+                continue
+
+            detail_url = raw_href if raw_href.startswith("http") else f"{base_url}{raw_href}"
+
+            # Extract book and author from URL slug
+            match = re.search(r"/selections/([^/]+)/?", detail_url, flags=re.IGNORECASE)
+            if not match:
+                continue
+
+            slug = match.group(1)
+            parts = re.split(r"(?i)-by-", slug, maxsplit=1)
+
+            if len(parts) == 2:
+                book_slug, author_slug = parts
+            else:
+                book_slug = slug
+                author_slug = ""
+
+            title = book_slug.replace("-", " ").title().strip()
+            author = author_slug.replace("-", " ").title().strip()
+
+            if title:
+                books.append(Book(title=title, author=author, store_url=detail_url))
+
+        except Exception as e:
+            logger.warning(f"Error processing Books & Books item: {e}")
+            continue
+    return books
+
+
+class PageCache:
+    """Validators, content hash and (enriched) books of each staff-pick page, kept across runs"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.conn = connect_cache(path or os.getenv("ENRICHMENT_CACHE_PATH", DEFAULT_CACHE_PATH))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS staff_pick_pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT NOT NULL,
+                books TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self.unchanged = 0
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, content_hash, books FROM staff_pick_pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, books = row
+        return {
+            'etag': etag,
+            'last_modified': last_modified,
+            'content_hash': content_hash,
+            'books': [Book(**book) for book in json.loads(books)],
+        }
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], content_hash: str,
+            books: List[Book]):
+        with self._lock:
+            self.conn.execute("""
+                INSERT INTO staff_pick_pages (url, etag, last_modified, content_hash, books, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash,
+                    books = excluded.books,
+                    fetched_at = excluded.fetched_at
+            """, (url, etag, last_modified, content_hash, json.dumps([asdict(b) for b in books]), time.time()))
+            self.conn.commit()
+
+    def update_books(self, books: Iterable[Book]):
+        """Write enrichment done after scraping back onto the cached books of each page"""
+        by_source: Dict[str, Dict[tuple, Book]] = {}
+        for book in books:
+            if book.source in SCRAPERS:
+                by_source.setdefault(book.source, {})[(book.title.lower(), book.store_url)] = book
+
+        for source, enriched in by_source.items():
+            url = SCRAPERS[source].url
+            with self._lock:
+                row = self.conn.execute("SELECT books FROM staff_pick_pages WHERE url = ?", (url,)).fetchone()
+                if row is None:
+                    continue
+                cached = [Book(**book) for book in json.loads(row[0])]
+                merged = [enriched.get((book.title.lower(), book.store_url), book) for book in cached]
+                self.conn.execute(
+                    "UPDATE staff_pick_pages SET books = ? WHERE url = ?",
+                    (json.dumps([asdict(b) for b in merged]), url)
+                )
+                self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def limiter_for(scrapers: Iterable[StaffPickScraper], limiter: Optional[HostRateLimiter] = None) -> HostRateLimiter:
+    """The shared limiter (or `limiter`) with each store's own rate for its host"""
+    limiter = limiter or SHARED_LIMITER
+    for scraper in scrapers:
+        limiter.setdefault_rate(scraper.host, scraper.calls_per_second)
+    return limiter
+
+
+def scrape_store(scraper: StaffPickScraper, session: requests.Session, limiter: HostRateLimiter,
+                 page_cache: Optional[PageCache] = None) -> List[Book]:
+    """
+    Fetch and parse one store's staff picks; errors are logged and yield no books.
+
+    With a page cache the request is conditional, and an unchanged page (304,
+    or the same content hash) returns the cached books without parsing.
+    """
+    from bs4 import BeautifulSoup
+
+    cached = page_cache.get(scraper.url) if page_cache is not None else None
+    headers = {}
+    if cached is not None:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    try:
+        response = limited_request('GET', scraper.url, session=session, limiter=limiter,
+                                   headers=headers, timeout=scraper.timeout)
+        if response.status_code == 304 and cached is not None:
+            page_cache.unchanged += 1
+            logger.info(f"{scraper.name} staff picks not modified, reusing {len(cached['books'])} books")
+            return cached['books']
+        response.raise_for_status()
+
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        if cached is not None and cached['content_hash'] == content_hash:
+            books = cached['books']
+            page_cache.unchanged += 1
+            logger.info(f"{scraper.name} staff picks unchanged, reusing {len(books)} books")
+        else:
+            books = scraper.parse(BeautifulSoup(response.content, "html.parser"), scraper.base_url)
+            for book in books:
+                book.source = scraper.name
+            logger.info(f"Scraped {len(books)} books from {scraper.name}")
+
+        if page_cache is not None:
+            page_cache.put(scraper.url, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                           content_hash, books)
+        return books
+    except requests.RequestException as e:
+        logger.error(f"Error scraping {scraper.name}: {e}")
+    except Exception as e:
+        logger.error(f"Unexpected error scraping {scraper.name}: {e}")
+    return []
+
+
+def scrape_all(session: requests.Session, limiter: Optional[HostRateLimiter] = None,
+               names: Optional[Iterable[str]] = None, page_cache: Optional[PageCache] = None) -> List[Book]:
+    """
+    Scrape every registered store (or just `names`) concurrently, one thread per store.
+    Books are returned grouped by store in registration order.
+    """
+    scrapers = [SCRAPERS[name] for name in (names or SCRAPERS)]
+    if not scrapers:
+        return []
+    limiter = limiter or limiter_for(scrapers)
+
+    with ThreadPoolExecutor(max_workers=len(scrapers), thread_name_prefix="staff-picks") as executor:
+        results = [executor.submit(scrape_store, scraper, session, limiter, page_cache) for scraper in scrapers]
+        return [book for future in results for book in future.result()]
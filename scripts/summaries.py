@@ -0,0 +1,111 @@
+"""
+Aggregates of the reading history that the dashboard shows.
+
+Each summary is computed with pandas from the prepared books frame (database
+column names, see books_db.prepare_books_frame) and stored in its own small
+table by the load stage, so the dashboard can read a few kilobytes of
+precomputed numbers instead of the whole books_read_ratings table.
+"""
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Ratings at or above this count as a success for the source that recommended the book
+SUCCESS_RATING = 4.0
+
+# Rating histograms use buckets of this width (0.0, 0.5, ... 5.0)
+HISTOGRAM_BUCKET = 0.5
+
+
+def _known(series: pd.Series) -> pd.Series:
+    """Stripped text with blanks and 'nan' as missing"""
+    text = series.astype('string').str.strip()
+    return text.mask(text.isin(["", "nan"]))
+
+
+def year_summary(books: pd.DataFrame) -> pd.DataFrame:
+    """Books read, average ratings and fiction count per year"""
+    books = books[books['year_read'].notna()]
+    summary = books.assign(is_fiction=books['type'] == 'Fiction').groupby('year_read').agg(
+        book_count=('title', 'size'),
+        avg_rating=('rating', 'mean'),
+        avg_goodreads_rating=('goodreads_rating', 'mean'),
+        fiction_count=('is_fiction', 'sum'),
+    )
+    return summary.round(2).reset_index().sort_values('year_read')
+
+
+def source_summary(books: pd.DataFrame) -> pd.DataFrame:
+    """Average ratings per recommendation source, best first"""
+    books = books.assign(source=_known(books['source']))
+    books = books[books['source'].notna()]
+    summary = books.assign(is_success=books['rating'] >= SUCCESS_RATING).groupby('source').agg(
+        book_count=('title', 'size'),
+        avg_rating=('rating', 'mean'),
+        avg_goodreads_rating=('goodreads_rating', 'mean'),
+        success_rate=('is_success', 'mean'),
+    )
+    summary['rating_boost'] = summary['avg_rating'] - summary['avg_goodreads_rating']
+    summary['success_rate'] *= 100
+    return summary.round(2).reset_index().sort_values('avg_rating', ascending=False)
+
+
+def genre_summary(books: pd.DataFrame) -> pd.DataFrame:
+    """Books per (year, genre) and the genre's share of that year, genres lowercased"""
+    books = books.assign(genre=_known(books['genres']).str.lower())
+    books = books[books['year_read'].notna() & books['genre'].notna()]
+    counts = books.groupby(['year_read', 'genre']).size().rename('book_count').reset_index()
+    year_totals = books.groupby('year_read').size()
+    counts['year_share'] = (counts['book_count'] / counts['year_read'].map(year_totals) * 100).round(2)
+    return counts.sort_values(['year_read', 'book_count'], ascending=[True, False])
+
+
+def rating_histogram(books: pd.DataFrame) -> pd.DataFrame:
+    """Book counts per rating bucket, for the user's ratings and Goodreads ratings"""
+    histograms = []
+    for scale in ('rating', 'goodreads_rating'):
+        ratings = books[scale].dropna()
+        buckets = np.floor(ratings / HISTOGRAM_BUCKET) * HISTOGRAM_BUCKET
+        counts = buckets.value_counts().sort_index()
+        histograms.append(pd.DataFrame({'scale': scale, 'bucket': counts.index, 'book_count': counts.values}))
+    return pd.concat(histograms, ignore_index=True)
+
+
+# Table name -> ((column, SQL type) in table order, builder)
+SUMMARY_TABLES: Dict[str, Tuple[List[Tuple[str, str]], Callable[[pd.DataFrame], pd.DataFrame]]] = {
+    'book_summary_by_year': ([
+        ('year_read', 'INTEGER PRIMARY KEY'),
+        ('book_count', 'INTEGER'),
+        ('avg_rating', 'FLOAT'),
+        ('avg_goodreads_rating', 'FLOAT'),
+        ('fiction_count', 'INTEGER'),
+    ], year_summary),
+    'book_summary_by_source': ([
+        ('source', 'VARCHAR(255) PRIMARY KEY'),
+        ('book_count', 'INTEGER'),
+        ('avg_rating', 'FLOAT'),
+        ('avg_goodreads_rating', 'FLOAT'),
+        ('success_rate', 'FLOAT'),
+        ('rating_boost', 'FLOAT'),
+    ], source_summary),
+    'book_summary_by_genre': ([
+        ('year_read', 'INTEGER'),
+        ('genre', 'TEXT'),
+        ('book_count', 'INTEGER'),
+        ('year_share', 'FLOAT'),
+    ], genre_summary),
+    'book_rating_histogram': ([
+        ('scale', 'VARCHAR(32)'),
+        ('bucket', 'FLOAT'),
+        ('book_count', 'INTEGER'),
+    ], rating_histogram),
+}
+
+
+def build_summaries(books: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Every summary table's rows, with columns in table order"""
+    return {
+        table: builder(books)[[column for column, _ in columns]]
+        for table, (columns, builder) in SUMMARY_TABLES.items()
+    }
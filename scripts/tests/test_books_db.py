@@ -0,0 +1,17 @@
+import pandas as pd
+
+from books_db import prepare_books_frame
+from cleaning import clean_ratings
+
+
+def test_missing_ratings_trend_is_null():
+    df = pd.DataFrame({
+        'Title': ['Rated', 'Unrated'],
+        'Author': ['A', 'B'],
+        'Year read': [2021, 2022],
+        'Rating': ['4', '3'],
+        'Goodreads Rating': ['3.5', None],
+    })
+    frame = prepare_books_frame(clean_ratings(df))
+
+    assert frame['ratings_trend'].tolist() == ['Over', None]
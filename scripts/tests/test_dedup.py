@@ -0,0 +1,22 @@
+from dedup import deduplicate, drop_known, title_numbers
+
+
+def test_next_volume_of_a_read_series_is_kept():
+    known = [("My Struggle Book 1", "Karl Ove Knausgaard")]
+    candidates = [("My Struggle Book 2", "Karl Ove Knausgaard"), ("My Struggle: Book 1", "Knausgaard")]
+
+    remaining = drop_known(candidates, known, key=lambda book: book)
+
+    assert remaining == [("My Struggle Book 2", "Karl Ove Knausgaard")]
+
+
+def test_roman_and_arabic_volume_numbers_match():
+    books = [("The Expanse Book II", "James S. A. Corey"), ("The Expanse Book 2", "James S.A. Corey"),
+             ("The Expanse Book III", "James S. A. Corey")]
+
+    assert deduplicate(books, key=lambda book: book) == [books[0], books[2]]
+
+
+def test_title_numbers():
+    assert title_numbers("book iv of 12") == {4, 12}
+    assert title_numbers("the overstory") == set()
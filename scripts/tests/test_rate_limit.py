@@ -0,0 +1,33 @@
+import threading
+import time
+
+import pytest
+
+from rate_limit import HostRateLimiter
+
+
+@pytest.mark.parametrize("rate", [0, -1.0])
+def test_non_positive_rates_are_rejected(rate):
+    with pytest.raises(ValueError):
+        HostRateLimiter(calls_per_second=rate)
+    with pytest.raises(ValueError):
+        HostRateLimiter().set_rate("example.com", rate)
+
+
+def test_throttle_during_a_wait_is_honored():
+    limiter = HostRateLimiter(calls_per_second=10, burst=1)
+    limiter.wait("example.com")  # uses the burst token
+    finished = []
+
+    def waiter():
+        limiter.wait("example.com")  # reserved slot about 0.1s away
+        finished.append(time.monotonic())
+
+    start = time.monotonic()
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.02)
+    limiter.throttle("example.com", retry_after=0.3)
+    thread.join()
+
+    assert finished[0] - start >= 0.3
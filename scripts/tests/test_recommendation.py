@@ -0,0 +1,47 @@
+import pandas as pd
+
+from update_database import IntelligentRecommendationEngine, RecommendationBook
+
+
+def make_engine():
+    history = pd.DataFrame({
+        'Title': ['Read One', 'Read Two'],
+        'Author': ['Known Author', 'Other Author'],
+        'Rating': [4.0, 3.0],
+        'Goodreads Rating': [3.9, 3.8],
+        'Source': ['Friend', 'Friend'],
+        'genres': ['fantasy', 'fantasy'],
+    })
+    return IntelligentRecommendationEngine(history)
+
+
+def candidates(ratings):
+    return [RecommendationBook(title=f"Candidate {i}", author=f"New Author {i}", source="Staff Picks",
+                               goodreads_rating=rating)
+            for i, rating in enumerate(ratings)]
+
+
+def stable_sort_titles(engine, books, top_k):
+    """Baseline: score every book, then a stable full sort"""
+    scored = engine.score_candidates(books, top_k=len(books))
+    return [book.title for book in sorted(scored, key=lambda book: -book.recommendation_score)][:top_k]
+
+
+def test_ties_at_the_cutoff_keep_list_order():
+    engine = make_engine()
+    # Many more ties than K, with the tied candidates spread through the list
+    ratings = [4.0] * 200
+    ratings[150] = 4.5
+    books = candidates(ratings)
+
+    top = [book.title for book in engine.score_candidates(books, top_k=4)]
+
+    assert top == ["Candidate 150", "Candidate 0", "Candidate 1", "Candidate 2"]
+    assert top == stable_sort_titles(engine, candidates(ratings), 4)
+
+
+def test_all_tied_winner_is_first_candidate():
+    engine = make_engine()
+    books = candidates([4.2] * 500)
+
+    assert engine.score_candidates(books, top_k=1)[0].title == "Candidate 0"
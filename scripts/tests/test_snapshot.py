@@ -0,0 +1,37 @@
+import pandas as pd
+
+from cleaning import clean_ratings
+from snapshot import write_snapshot
+
+
+def sheet_frame():
+    """As the enrich stage hands it over: sheet strings, cleaned ratings"""
+    return clean_ratings(pd.DataFrame({
+        'Title': ['Dune', 'Piranesi'],
+        'Author': ['Frank Herbert', 'Susanna Clarke'],
+        'Year read': ['2021', '2022'],
+        'Rating': ['4', '5'],
+        'Goodreads Rating': ['4.25', None],
+        'num_ratings': ['1000', ''],
+    }))
+
+
+def database_frame():
+    """The same rows as read_books_table returns them"""
+    return pd.DataFrame({
+        'Title': ['Piranesi', 'Dune'],
+        'Author': ['Susanna Clarke', 'Frank Herbert'],
+        'Year read': [2022, 2021],
+        'Rating': [5.0, 4.0],
+        'Goodreads Rating': [None, 4.25],
+        'num_ratings': [None, 1000],
+        'Ratings gap': [None, -0.25],
+        'Ratings trend': [None, 'Under'],
+    })
+
+
+def test_version_does_not_depend_on_column_types(tmp_path):
+    from_sheet = write_snapshot(sheet_frame(), directory=str(tmp_path / "sheet"))
+    from_database = write_snapshot(database_frame(), directory=str(tmp_path / "database"))
+
+    assert from_sheet['version'] == from_database['version']
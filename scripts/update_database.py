@@ -1,52 +1,64 @@
-import pandas as pd
-import numpy as np
+#!/usr/bin/env python3
+"""
+Nightly pipeline behind the reading dashboard.
 
-from pandas.io import sql
-import json
-from oauth2client.service_account import ServiceAccountCredentials
-from googleapiclient.discovery import build
-import re
+Stages can be run on their own or together:
 
+    pull       read the 'raw' worksheet
+    enrich     Goodreads/OpenAI enrichment and cleaning, write the 'updated' worksheet
+    load       load the processed books into books_read_ratings
+    recommend  pick today's book and save it to daily_recommendations
+    snapshot   write the versioned, compressed dataset snapshot and its manifest
+    all        every stage in order (default)
 
+    python scripts/update_database.py [stage] [--full-refresh] [--profile]
+
+Heavy dependencies (Google APIs, gspread, OpenAI, BeautifulSoup, psycopg2)
+are imported by the stages that need them, so a load-only or
+recommend-only run skips both their import cost and the sheet scrape.
+"""
+import argparse
+import base64
+import logging
 import os
-import gspread
-from df2gspread import df2gspread as d2g
-from oauth2client.service_account import ServiceAccountCredentials
-import openai
-from openai import OpenAI
-from typing import Dict
+import re
+import sys
+import tempfile
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
 
-import requests
-from bs4 import BeautifulSoup
+import numpy as np
 import pandas as pd
+import requests
 
-from dotenv import load_dotenv
-
-load_dotenv()
-
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("OPENAI_API_KEY is not set in the environment or .env file.")
+import dedup
+import staff_picks
+from book_keys import normalize_text, title_author_key
+from books_db import copy_swap_books_table, prepare_books_frame, sync_books_table, unread_positions
+from cleaning import clean_counts, clean_ratings
+from db_session import DatabaseSession
+from enrichment_cache import DEFAULT_CACHE_PATH, UNCLASSIFIED_GENRE, EnrichmentCache, LookupCache
+from genre_classifier import UNKNOWN_GENRE, GenreClassifier, get_genre_classifier
+from rate_limit import SHARED_LIMITER, HostRateLimiter, limited_request
+from run_report import DEFAULT_REPORT_PATH, REPORT
+from staff_picks import Book
+from summaries import source_summary
 
-spreadsheet_id = os.getenv("SPREADSHEET_ID")
-if not spreadsheet_id:
-    raise ValueError("SPREADSHEET_ID is not set in the environment")
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
+STAGES = ['pull', 'enrich', 'load', 'recommend', 'snapshot']
 
-goog_key = os.getenv("GOOGLE_API_KEY")
-oai_key = os.getenv("OPENAI_API_KEY")
-data_url = os.getenv("DATABASE_URL")
-SA_JSON_B64 = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON_B64") 
-if not SA_JSON_B64:
-    raise RuntimeError(
-        "GOOGLE_SERVICE_ACCOUNT_JSON_B64 is not set. "
-        "Add it as a GitHub secret or in your local .env."
-    )
+GOOGLE_BOOKS_HOST = "www.googleapis.com"
+GOOGLE_BOOKS_VOLUMES_URL = f"https://{GOOGLE_BOOKS_HOST}/books/v1/volumes"
 
-import base64, tempfile
-sa_path = tempfile.NamedTemporaryFile(delete=False, suffix=".json").name
-with open(sa_path, "wb") as f:
-    f.write(base64.b64decode(SA_JSON_B64))
+# Partial-response projections: only the fields that are actually read
+GOOGLE_BOOKS_AUTHOR_FIELDS = "items(volumeInfo(authors))"
+GOOGLE_BOOKS_DETAIL_FIELDS = "items(volumeInfo(title,authors,publishedDate,categories,industryIdentifiers))"
 
 SCOPES = [
     'https://spreadsheets.google.com/feeds',
@@ -55,29 +67,12 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive'
 ]
 
-# Reauthorize with explicit scopes
-credentials = ServiceAccountCredentials.from_json_keyfile_name(sa_path, scopes=SCOPES)
-
-# Rebuild services
-service = build('sheets', 'v4', credentials=credentials)
-gc = gspread.authorize(credentials)
-
-
-workbook = gc.open_by_key(spreadsheet_id)
-
-
-
-sheet = workbook.worksheet('raw')
-values = sheet.get_all_values()
-df1 = pd.DataFrame(values[1:], columns = values[0])
-
-
-
-headers = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Referer': 'https://www.google.com/'
-}
 
+def require_env(name: str, hint: str = "") -> str:
+    value = os.getenv(name)
+    if not value:
+        raise ValueError(f"{name} is not set in the environment or .env file.{' ' + hint if hint else ''}")
+    return value
 
 
 def print_structure_report(structure_info):
@@ -110,306 +105,46 @@ html_content = ... # Your Goodreads HTML here
 """
 
 
+def _row_author(row) -> str:
+    """Author value already present on a sheet row, if any"""
+    author = row.get('Author')
+    if author is None or pd.isna(author):
+        return ""
+    return str(author).strip()
 
-import os
-from typing import Dict
-
-def get_primary_genre(book_info: Dict[str, str], api_key: str) -> str:
-    """
-    Use GPT-3.5 (or GPT-4) to determine the most appropriate primary genre based on book information.
-    """
-    # Create OpenAI client with the API key
-    client = OpenAI(api_key=api_key)
-
-    prompt = f"""Based on this book information, what is the single most specific and meaningful literary genre?
-Choose from these common book genres ONLY:
-- coming-of-age
-- psychological fiction
-- historical fiction
-- science fiction
-- fantasy
-- mystery
-- thriller
-- romance
-- literary fiction
-- dystopian
-- horror
-- memoir
-- biography
-- political fiction
-- satire
-
-Title: {book_info.get('title', '')}
-Author: {book_info.get('author', '')}
-Description: {book_info.get('description', '')}
-Goodreads genres: {book_info.get('raw_genres', [])}
-
-Respond ONLY with the genre name, nothing else. Choose the MOST specific genre that best captures the book's primary theme."""
-
-    try:
-        # Use the new method for creating chat completions
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are a literary expert who specializes in genre classification. "
-                        "Respond only with the genre name, without explanation."
-                    )
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-            max_tokens=10,
-        )
-
-        # Access the content differently in the new version
-        genre = response.choices[0].message.content.strip().lower()
-        return genre
 
-    except Exception as e:
-        print(f"Error calling OpenAI API: {e}")
-        return "Unknown"
+def _fetch_book_info(title: str, limiter: HostRateLimiter) -> Optional[Dict]:
+    """Fetch and parse the top Goodreads search result for a title (runs in worker threads)"""
+    from goodreads import fetch_goodreads_search_results, parse_goodreads_search_results
 
-def get_rating_from_openai(context: str) -> float:
-    """
-    Use OpenAI's Chat API to extract a numerical Goodreads rating from a text snippet.
-    Returns the rating as a float if successful, otherwise returns None.
-    """
-    # Create client with API key from environment
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    prompt = (
-        "Extract the numerical book rating from the following text. "
-        "Return only the number (as a float), and nothing else.\n\n"
-        f"Text: {context}\n\nRating: "
-    )
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an assistant that extracts numerical values."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0,
-            max_tokens=5,
-        )
-        # The response should be something like "4.2"
-        text = response.choices[0].message.content.strip()
-        return float(text)
-    except Exception as e:
-        print(f"Error extracting rating with OpenAI: {e}")
+    details = fetch_goodreads_search_results(title, limiter=limiter)
+    if not details:
+        return None
+    items = parse_goodreads_search_results(details, classify=False)
+    if not items or not items[0]:
         return None
+    return items[0]
 
 
-def parse_goodreads_search_results(html):
+def update_spreadsheet(df, cache: Optional[EnrichmentCache] = None, incremental: bool = True,
+                       max_workers: int = 4, requests_per_second: float = 0.5, burst: float = 1.0,
+                       classifier: Optional[GenreClassifier] = None):
     """
-    Parse Goodreads search results with OpenAI genre extraction.
-    """
-    soup = BeautifulSoup(html, 'html.parser')
-    book_entries = soup.find_all('tr', {'itemscope': '', 'itemtype': 'http://schema.org/Book'})
-    
-    books = []
-    for entry in book_entries[:1]:  # Still only take first result as most relevant
-        try:
-            # Basic metadata extraction
-            book_title_element = entry.find('a', class_='bookTitle')
-            if not book_title_element:
-                continue
-            book_title = book_title_element.get_text(strip=True)
-            book_url = 'https://www.goodreads.com' + book_title_element['href']
-            
-            # Author extraction
-            author_containers = entry.find_all('div', class_='authorName__container')
-            authors = []
-            for container in author_containers:
-                author_element = container.find('a', class_='authorName')
-                if author_element:
-                    author_name = author_element.get_text(strip=True)
-                    role = container.find('span', class_='role')
-                    if role:
-                        role_text = role.get_text(strip=True)
-                        authors.append(f"{author_name} {role_text}")
-                    else:
-                        authors.append(author_name)
-            author = ', '.join(authors) if authors else 'Unknown'
-            
-            # Rating extraction
-
-            # Rating extraction
-            rating_element = entry.find('span', class_='minirating')
-            if rating_element:
-                # Get raw text and remove undesired substrings
-                rating_text = rating_element.get_text(strip=True)
-                rating_text_clean = rating_text.replace("really liked it", "").strip()
-                
-                # Use regex to search for a number (float)
-                match = re.search(r"([\d\.]+)", rating_text_clean)
-                if match:
-                    try:
-                        rating = float(match.group(1))
-                    except Exception as e:
-                        print(f"Could not convert extracted rating '{match.group(1)}' to float: {e}")
-                        rating = None
-                else:
-                    rating = None
-                
-                # Extract number of ratings if possible using splitting.
-                try:
-                    parts = rating_text_clean.split("—")
-                    if len(parts) > 1:
-                        num_ratings_str = parts[1].strip().split()[0]
-                        num_ratings = int(num_ratings_str.replace(",", ""))
-                    else:
-                        num_ratings = None
-                except Exception as e:
-                    print(f"Could not extract num_ratings from '{rating_text_clean}': {e}")
-                    num_ratings = None
-            else:
-                rating = None
-                num_ratings = None
-
-
-            # Fallback: if rating is None, use OpenAI to extract the rating from the raw text
-            if rating is None:
-                # Use the entire rating_text if available, or a default context
-                if rating is None:
-                # Optionally, include more context from the entry
-                    context = f"Goodreads info: {rating_text}" if rating_element else "No rating info available."
-                    rating = get_rating_from_openai(context)
-
-
-            def get_higher_res_cover(cover_url):
-                """
-                Transform Goodreads cover URL to get higher resolution version
-                """
-                if not cover_url:
-                    return None
-                
-                # Goodreads URLs often have size indicators that can be modified
-                # Example: ._SY75_.jpg -> ._SY475_.jpg or no size indicator for full size
-                
-                # Remove existing size indicators
-                import re
-                high_res_url = re.sub(r'\._[A-Z0-9]+_\.', '.', cover_url)
-                
-                # Or try to replace with larger size
-                if '._SY75_.' in cover_url:
-                    high_res_url = cover_url.replace('._SY75_.', '._SY475_.')
-                elif '._SX50_.' in cover_url:
-                    high_res_url = cover_url.replace('._SX50_.', '._SX318_.')
-                
-                return high_res_url    
-            
-            # Cover URL extraction
-            cover_image_element = entry.find('img', class_='bookCover')
-            cover_image_url = cover_image_element['src'] if cover_image_element else None
-            cover_image_url = get_higher_res_cover(cover_image_url)
-            
-            # Editions extraction
-            editions_element = entry.find('a', class_='greyText', string=lambda x: 'editions' in str(x) if x else False)
-            num_editions = editions_element.get_text(strip=True) if editions_element else None
-
-            # Prepare book info for OpenAI genre classification
-            book_info = {
-                'title': book_title,
-                'author': author,
-                'description': '',  # You might want to fetch this separately if possible
-                'raw_genres': []  # Collect any genre-like text from the page
-            }
-
-            # Collect any potential genre indicators
-            genre_containers = entry.find_all(['div', 'span'], class_=['genre', 'shelf'])
-            for container in genre_containers:
-                links = container.find_all('a')
-                for link in links:
-                    genre = link.get_text(strip=True).lower()
-                    if genre and genre not in ['fiction', 'non-fiction']:
-                        book_info['raw_genres'].append(genre)
-
-            # Use OpenAI to classify the primary genre
-            primary_genre = get_primary_genre(book_info, api_key)
-
-            # Determine book type
-            book_type = 'Fiction' if primary_genre != 'Unknown' else 'Unknown'
-            
-            books.append({
-                'title': book_title,
-                'url': book_url,
-                'author': author,
-                'rating': rating,
-                'num_ratings': num_ratings,
-                'num_editions': num_editions,
-                'cover_image_url': cover_image_url,
-                'genres': primary_genre,
-                'type': book_type
-            })
-            
-        except Exception as e:
-            print(f"Error processing book entry: {e}")
-            continue
-    
-    return books
-
+    Update the spreadsheet with book details from Goodreads.
 
+    When a cache is given, rows whose cached entry is still fresh are filled
+    from disk. In incremental mode only new or stale rows hit the network;
+    otherwise every row is refetched and the cache is refreshed. Cached books
+    whose genre classification failed are only reclassified, not refetched.
 
-def fetch_goodreads_search_results(query):
-    """
-    Fetch search results from Goodreads with proper error handling.
+    Network lookups run on a pool of `max_workers` threads that share a
+    per-host limit of `requests_per_second` (at most `burst` requests back to
+    back, however many workers there are), and all results are written back
+    to the DataFrame in a single assignment at the end. Genres for freshly
+    fetched books are classified in batches once all lookups have finished.
     """
-    encoded_query = urllib.parse.quote(query)
-    base_url = 'https://www.goodreads.com/search'
-    url = f'{base_url}?q={encoded_query}&search_type=books'
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'DNT': '1',
-        'Upgrade-Insecure-Requests': '1'
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, timeout=12)
-        
-        if response.status_code == 200:
-            return response.text
-        elif response.status_code == 403:
-            print("Access denied. Request was blocked by Goodreads.")
-            return None
-        elif response.status_code == 429:
-            print("Too many requests. Rate limit exceeded.")
-            return None
-        else:
-            print(f"Request failed with status code: {response.status_code}")
-            return None
-            
-    except requests.exceptions.Timeout:
-        print("Request timed out. Goodreads server took too long to respond.")
-        return None
-    except requests.exceptions.ConnectionError:
-        print("Connection error. Please check your internet connection.")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while fetching results: {str(e)}")
-        return None
+    from goodreads import rating_extractor
 
-
-
-
-import urllib.parse
-import time
-
-
-
-def update_spreadsheet(df):
-    """
-    Update the spreadsheet with book details from Goodreads.
-    """
     # Add new columns if they don't exist
     new_columns = ['Author', 'Goodreads Rating', 'Cover_url', 'num_ratings', 'num_editions', 'genres', 'type']
     for col in new_columns:
@@ -424,221 +159,153 @@ def update_spreadsheet(df):
         df['Source'] = df['Source'].fillna('Unknown')
         df['Source'] = df['Source'].replace('', 'Unknown')  # Handle empty strings
 
+    update_fields = {
+        'Author': 'author',
+        'Goodreads Rating': 'rating',
+        'Cover_url': 'cover_image_url',
+        'num_ratings': 'num_ratings',
+        'num_editions': 'num_editions',
+        'genres': 'genres',
+        'type': 'type'
+    }
+
     success_count = 0
     error_count = 0
-    delay = 2  # seconds between requests
-    
+    cached_count = 0
+    results = {}  # row index -> parsed book info
+    pending = []  # (row index, title, author, stale cache entry)
+    fetched = []  # (row index, title, author) looked up on the network this run
+
     for index, row in df.iterrows():
-        try:
-            title = row['Title']
-            if pd.isna(title) or not title.strip():
-                print(f"Skipping row {index}: Empty title")
-                continue
-                
-            # print(f"Processing {index + 1}/{len(df)}: {title}")
-            
-            details = fetch_goodreads_search_results(title)
-            if not details:
+        title = row['Title']
+        if pd.isna(title) or not str(title).strip():
+            print(f"Skipping row {index}: Empty title")
+            continue
+
+        author = _row_author(row)
+        cached = cache.get(title, author) if cache is not None else None
+        if incremental and cached is not None and cached.is_fresh:
+            results[index] = cached.values
+            cached_count += 1
+        else:
+            pending.append((index, title, author, cached))
+
+    from goodreads import GOODREADS_HOST
+
+    # Shared with every other Goodreads caller in the run, so 429 backoff applies to all of them
+    limiter = SHARED_LIMITER
+    limiter.set_rate(GOODREADS_HOST, requests_per_second, burst=burst)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            executor.submit(_fetch_book_info, title, limiter): (index, title, author, cached)
+            for index, title, author, cached in pending
+        }
+        for future in as_completed(futures):
+            index, title, author, cached = futures[future]
+            try:
+                book_info = future.result()
+            except Exception as e:
+                print(f"Error processing {title}: {str(e)}")
+                book_info = None
+
+            if book_info:
+                if cached is not None and not cached.needs_classification:
+                    # Genres never expire, so a refresh only needs the volatile fields
+                    book_info['genres'] = cached.values['genres']
+                    book_info['type'] = cached.values.get('type')
+                results[index] = book_info
+                fetched.append((index, title, author))
+            elif cached is not None:
+                # Keep serving the stale entry rather than blanking the row
+                print(f"Refresh failed, using cached details for: {title}")
+                results[index] = cached.values
+                cached_count += 1
+            else:
                 print(f"Could not fetch details for: {title}")
                 error_count += 1
-                continue
-                
-            items = parse_goodreads_search_results(details)
-            if not items or not items[0]:
-                print(f"No results found for: {title}")
-                error_count += 1
-                continue
-            
-            book_info = items[0]
-            
-            update_fields = {
-                'Author': 'author',
-                'Goodreads Rating': 'rating',
-                'Cover_url': 'cover_image_url',
-                'num_ratings': 'num_ratings',
-                'num_editions': 'num_editions',
-                'genres': 'genres',
-                'type': 'type'
-            }
-            
-            for df_col, items_key in update_fields.items():
-                if items_key in book_info:
-                    df.at[index, df_col] = book_info[items_key]
-            
-            success_count += 1
-            time.sleep(delay)
-            
-        except Exception as e:
-            print(f"Error processing {title}: {str(e)}")
-            error_count += 1
-            continue
+
+    # Fetched books without genres, and cached ones whose earlier classification failed
+    unclassified = [index for index in results if results[index].get('genres') in (None, '', UNCLASSIFIED_GENRE)]
+    if unclassified:
+        classifier = classifier or get_genre_classifier(os.getenv("OPENAI_API_KEY"), os.getenv("ENRICHMENT_CACHE_PATH"))
+        genres = classifier.classify_many([results[index] for index in unclassified])
+        for index, genre in zip(unclassified, genres):
+            results[index]['genres'] = genre
+            results[index]['type'] = 'Fiction' if genre != UNKNOWN_GENRE else 'Unknown'
+        print(f"Classified {len(unclassified)} genres with {classifier.api_calls} OpenAI requests "
+              f"({classifier.memo_hits} memo hits)")
+
+    if cache is not None:
+        fetched_indexes = set()
+        for index, title, author in fetched:
+            cache.put(title, author, results[index])
+            fetched_indexes.add(index)
+        # Served from cache: store the new classification without touching the fetch times
+        for index in set(unclassified) - fetched_indexes:
+            row = df.loc[index]
+            cache.put(row['Title'], _row_author(row),
+                      {name: results[index][name] for name in ('genres', 'type')})
+
+    if results:
+        updates = pd.DataFrame.from_dict(results, orient='index')
+        updates = updates.reindex(columns=list(update_fields.values()))
+        updates.columns = list(update_fields.keys())
+        # Only overwrite cells for fields the source actually returned
+        df.loc[updates.index, updates.columns] = updates.combine_first(
+            df.loc[updates.index, updates.columns]
+        )
+        success_count = len(results)
             
     print(f"\nUpdate Complete!")
     print(f"Successful updates: {success_count}")
+    print(f"Served from cache: {cached_count}")
     print(f"Failed updates: {error_count}")
     print(f"Total processed: {len(df)}")
+    print(f"Rating extraction tiers: {rating_extractor.summary()}")
+    
+    if cache is not None:
+        REPORT.record_cache('goodreads_enrichment', cache.hits, cache.misses)
+    REPORT.count('goodreads_rows_fetched', len(fetched))
+    REPORT.count('goodreads_rows_failed', error_count)
+    for tier, hits in rating_extractor.tier_hits.items():
+        REPORT.count(f"rating_extraction_{tier}", hits)
     
     return df
 
-import re
-import pandas as pd
-
-def parse_goodreads_rating(x):
-    """
-    Clean and convert a raw Goodreads rating text to a float.
-    If x is not a string or conversion fails, return None.
-    """
-    if isinstance(x, str):
-        # Remove any unwanted text like "really liked it"
-        cleaned = x.replace("really liked it", "").strip()
-        
-        # Use regex to extract the first floating-point number
-        match = re.search(r"([\d]+\.[\d]+)", cleaned)
-        if match:
-            try:
-                return float(match.group(1))
-            except Exception as e:
-                print(f"Error converting '{match.group(1)}' to float: {e}")
-                return None
-        else:
-            return None
-    else:
-        return x
-
-# Apply this function to the "Goodreads Rating" column
-
-
-
-update_spreadsheet(df1)
-
-
-# df1['Ratings count'] = [x.split("— ")[1].replace(" ratings","") for x in df1['Goodreads Rating']]
-df1['Goodreads Rating'] = df1['Goodreads Rating'].apply(parse_goodreads_rating)
-# df1['Goodreads Rating'] = pd.to_numeric(df1['Goodreads Rating'], errors='coerce')
-df1['Rating'] = pd.to_numeric(df1['Rating'], errors='coerce')
-# df1['Goodreads Rating'] = [
-#     x.split(" avg rating")[0].replace("really liked it", "") if isinstance(x, str) else x
-#     for x in df1['Goodreads Rating']
-# ]
-
-
-df1['Ratings gap'] = df1['Rating'].astype('float') - df1['Goodreads Rating'].astype('float')
-
-
-
-df1['Ratings trend'] = np.where(df1['Rating'] > df1['Goodreads Rating'], 'Over', 'Under')
-
-
-
-df1 = df1.fillna(0)
-
-
-
-d2g.upload(df1, spreadsheet_id, 'updated', credentials=credentials, col_names=True,   row_names=False)
-
-
-import psycopg2
-
-# Test connection to new database
-conn = psycopg2.connect(data_url)
-print("Successfully connected to books_read_ratings database!")
-conn.close()
-
-
-# Data cleaning functions
-def clean_number(x):
-    if pd.isna(x):  # Handle NaN values
-        return None
-    if isinstance(x, str):
-        return int(x.replace(',', '').replace(" editions",""))
-    return x
-
-# Clean DataFrame before database insertion
-df_clean = df1.copy()
-numeric_columns = ['num_ratings', 'num_editions']  # Add any other columns with thousand separators
-
-for col in numeric_columns:
-    df_clean[col] = df_clean[col].apply(clean_number)
-
-
-import psycopg2
-import pandas as pd
-from io import StringIO
 
 # Add source performance analysis
 def calculate_source_performance(df):
-    """Calculate average ratings by recommendation source"""
-    source_stats = df.groupby('Source').agg({
-        'Rating': ['mean', 'count'],
-        'Goodreads Rating': 'mean'
-    }).round(2)
-    
-    # Flatten column names
-    source_stats.columns = ['avg_rating', 'book_count', 'avg_goodreads_rating']
-    source_stats = source_stats.reset_index()
-    
-    # Calculate performance vs Goodreads
-    source_stats['rating_boost'] = (source_stats['avg_rating'] - source_stats['avg_goodreads_rating']).round(2)
-    
-    return source_stats.sort_values('avg_rating', ascending=False)
-
-# Calculate source performance
-source_performance = calculate_source_performance(df_clean)
-print("Source Performance Analysis:")
-print(source_performance)
-
-import time
-import re
-import requests
-from bs4 import BeautifulSoup
-import urllib.parse
-import psycopg2
-from typing import List, Dict, Optional, Tuple
-import logging
-from dataclasses import dataclass
-from functools import lru_cache
-import json
+    """Calculate average ratings by recommendation source (the rows of book_summary_by_source)"""
+    return source_summary(prepare_books_frame(df))
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-@dataclass
-class Book:
-    """Data class for book information"""
-    title: str
-    author: str = ""
-    store_url: str = ""
-    goodreads_rating: float = 0.0
-    num_ratings: int = 0
-    publication_year: int = 0
-    genres: str = ""
-    isbn: str = ""
-    
-class RateLimiter:
-    """Simple rate limiter for API calls"""
-    def __init__(self, calls_per_second: float = 1.0):
-        self.min_interval = 1.0 / calls_per_second
-        self.last_call = 0
-    
-    def wait(self):
-        elapsed = time.time() - self.last_call
-        if elapsed < self.min_interval:
-            time.sleep(self.min_interval - elapsed)
-        self.last_call = time.time()
 
 class BookDataEnricher:
     """Handles enrichment of book data from various APIs"""
     
-    def __init__(self, google_api_key: str):
+    # Namespaces of the persistent lookup cache
+    AUTHOR_LOOKUPS = 'google_books_author'
+    DETAIL_LOOKUPS = 'google_books_details'
+    
+    def __init__(self, google_api_key: str, cache: Optional[LookupCache] = None):
         self.google_api_key = google_api_key
-        self.rate_limiter = RateLimiter(calls_per_second=0.5)  # Conservative rate limiting
+        # Shared across runs; "no result" answers are cached too, for a shorter time
+        self.cache = cache if cache is not None else LookupCache(
+            os.getenv("ENRICHMENT_CACHE_PATH", DEFAULT_CACHE_PATH))
+        self.api_calls = 0
+        self._lock = threading.Lock()
+        self.rate_limiter = SHARED_LIMITER
+        self.rate_limiter.setdefault_rate(GOOGLE_BOOKS_HOST, 0.5)  # Conservative rate limiting
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'BookRecommendationSystem/1.0'
+            # Google APIs only compress responses for user agents that mention gzip
+            'User-Agent': 'BookRecommendationSystem/1.0 (gzip)',
+            'Accept-Encoding': 'gzip',
         })
     
-    @lru_cache(maxsize=1000)
+    def _count_call(self):
+        with self._lock:
+            self.api_calls += 1
+    
     def lookup_author_google_books(self, title: str) -> str:
         """
         Look up author via Google Books API with caching and error handling
@@ -646,21 +313,27 @@ class BookDataEnricher:
         if not title.strip():
             return ""
         
-        self.rate_limiter.wait()
+        cache_key = normalize_text(title)
+        cached = self.cache.get(self.AUTHOR_LOOKUPS, cache_key)
+        if cached is not None:
+            return cached.value or ""
         
         # Clean title for better search results
         clean_title = re.sub(r'[^\w\s]', '', title).strip()
         query = urllib.parse.quote(f'intitle:"{clean_title}"')
         
-        url = f"https://www.googleapis.com/books/v1/volumes"
+        url = GOOGLE_BOOKS_VOLUMES_URL
         params = {
             'q': query,
             'maxResults': 1,
+            'fields': GOOGLE_BOOKS_AUTHOR_FIELDS,
             'key': self.google_api_key
         }
         
         try:
-            response = self.session.get(url, params=params, timeout=10)
+            self._count_call()
+            response = limited_request('GET', url, session=self.session, limiter=self.rate_limiter,
+                                       params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -668,13 +341,13 @@ class BookDataEnricher:
             
             if not items:
                 logger.debug(f"No Google Books results for: {title}")
+                self.cache.put(self.AUTHOR_LOOKUPS, cache_key, None)
                 return ""
             
             volume_info = items[0].get("volumeInfo", {})
-            authors = volume_info.get("authors", [])
-            
-            if authors:
-                return ", ".join(authors)
+            authors = ", ".join(volume_info.get("authors", []))
+            self.cache.put(self.AUTHOR_LOOKUPS, cache_key, authors or None)
+            return authors
             
         except requests.RequestException as e:
             logger.error(f"Google Books API error for '{title}': {e}")
@@ -687,28 +360,35 @@ class BookDataEnricher:
         """
         Get comprehensive book information from Google Books
         """
+        cache_key = title_author_key(title, author)
+        cached = self.cache.get(self.DETAIL_LOOKUPS, cache_key)
+        if cached is not None:
+            return Book(**cached.value) if cached.found else None
+        
         search_query = f'intitle:"{title}"'
         if author:
             search_query += f' inauthor:"{author}"'
         
         query = urllib.parse.quote(search_query)
-        url = f"https://www.googleapis.com/books/v1/volumes"
+        url = GOOGLE_BOOKS_VOLUMES_URL
         params = {
             'q': query,
             'maxResults': 1,
+            'fields': GOOGLE_BOOKS_DETAIL_FIELDS,
             'key': self.google_api_key
         }
         
-        self.rate_limiter.wait()
-        
         try:
-            response = self.session.get(url, params=params, timeout=10)
+            self._count_call()
+            response = limited_request('GET', url, session=self.session, limiter=self.rate_limiter,
+                                       params=params, timeout=10)
             response.raise_for_status()
             
             data = response.json()
             items = data.get("items", [])
             
             if not items:
+                self.cache.put(self.DETAIL_LOOKUPS, cache_key, None)
                 return None
             
             volume_info = items[0].get("volumeInfo", {})
@@ -728,22 +408,50 @@ class BookDataEnricher:
                     isbn = identifier.get("identifier", "")
                     break
             
-            return Book(
+            book = Book(
                 title=volume_info.get("title", title),
                 author=", ".join(volume_info.get("authors", [author] if author else [])),
                 publication_year=pub_year,
                 genres=", ".join(volume_info.get("categories", [])),
                 isbn=isbn
             )
+            self.cache.put(self.DETAIL_LOOKUPS, cache_key, asdict(book))
+            return book
             
         except Exception as e:
             logger.error(f"Error getting detailed info for '{title}': {e}")
             return None
 
+    def _map_parallel(self, func, books: List[Book], max_workers: int):
+        # Lookups share the Google Books rate limit; cached answers cost no request at all
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="google-books") as executor:
+            list(executor.map(func, books))
+    
+    def fill_authors(self, books: List[Book], max_workers: int = 4):
+        """Look up missing authors for all books in parallel"""
+        def add_author(book: Book):
+            if not book.author.strip():
+                book.author = self.lookup_author_google_books(book.title)
+
+        self._map_parallel(add_author, books, max_workers)
+    
+    def fill_details(self, books: List[Book], max_workers: int = 4):
+        """Add publication year, categories and ISBN to every book that lacks them, in parallel"""
+        def add_details(book: Book):
+            if book.publication_year or book.genres or book.isbn:
+                return
+            details = self.get_detailed_book_info(book.title, book.author)
+            if details:
+                book.publication_year = details.publication_year
+                book.genres = details.genres
+                book.isbn = details.isbn
+
+        self._map_parallel(add_details, books, max_workers)
+
 class BookScraper:
-    """Handles web scraping for bookstore staff picks"""
+    """Handles web scraping for bookstore staff picks (stores are plugins in staff_picks.SCRAPERS)"""
     
-    def __init__(self):
+    def __init__(self, page_cache: Optional[staff_picks.PageCache] = None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -751,210 +459,91 @@ class BookScraper:
             'Accept-Language': 'en-US,en;q=0.9',
             'Connection': 'keep-alive',
         })
-        self.rate_limiter = RateLimiter(calls_per_second=0.3)  # Respectful scraping
+        # Each store gets its own per-host rate
+        self.rate_limiter = staff_picks.limiter_for(staff_picks.SCRAPERS.values())
+        # Unchanged pages are neither downloaded nor parsed again
+        self.page_cache = page_cache if page_cache is not None else staff_picks.PageCache()
     
     def clean_title(self, raw_title: str) -> str:
         """Clean and normalize book titles"""
-        if not raw_title:
-            return ""
-        
-        # Remove "by Author" suffixes
-        parts = re.split(r"\s+by\s+", raw_title, flags=re.IGNORECASE, maxsplit=1)
-        cleaned = parts[0].strip()
-        
-        # Remove extra whitespace and normalize
-        cleaned = re.sub(r'\s+', ' ', cleaned)
-        return cleaned.title()
+        return staff_picks.clean_title(raw_title)
+    
+    def scrape_all_staff_picks(self) -> List[Book]:
+        """Scrape every registered store concurrently"""
+        return staff_picks.scrape_all(self.session, self.rate_limiter, page_cache=self.page_cache)
     
     def scrape_strand_staff_picks(self) -> List[Book]:
         """Scrape Strand Bookstore staff picks with error handling"""
-        books = []
-        base_url = "https://www.strandbooks.com"
-        url = f"{base_url}/collections/staff-picks.html"
-        
-        self.rate_limiter.wait()
-        
-        try:
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, "html.parser")
-            
-            for item in soup.select("div.item-wrapper-zyw"):
-                try:
-                    # Extract title and URL
-                    title_link = item.select_one("a.item-name-LPg[href]")
-                    if not title_link:
-                        continue
-                    
-                    title = self.clean_title(title_link.get_text(strip=True))
-                    href = title_link["href"].strip()
-                    
-                    if not href.startswith("http"):
-                        href = base_url + href
-                    
-                    # Extract author
-                    author_el = item.select_one(".item-authors-a24 li")
-                    author = author_el.get_text(strip=True) if author_el else ""
-                    
-                    if title:  # Only add if we have a title
-                        books.append(Book(
-                            title=title,
-                            author=author,
-                            store_url=href
-                        ))
-                        
-                except Exception as e:
-                    logger.warning(f"Error processing Strand item: {e}")
-                    continue
-            
-            logger.info(f"Scraped {len(books)} books from Strand")
-            
-        except requests.RequestException as e:
-            logger.error(f"Error scraping Strand: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error scraping Strand: {e}")
-        
-        return books
+        return staff_picks.scrape_all(self.session, self.rate_limiter, names=["Strand"],
+                                      page_cache=self.page_cache)
     
     def scrape_books_and_books_staff_picks(self) -> List[Book]:
         """Scrape Books & Books staff picks"""
-        books = []
-        base_url = "https://www.booksandbooks.com"
-        url = f"{base_url}/staff-selections/"
-        
-        self.rate_limiter.wait()
-        
-        try:
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.content, "html.parser")
-            
-            for h3 in soup.select("h3.book_title > a[href]"):
-                try:
-                    raw_href = h3["href"].strip()
-                    if not raw_href:
-                        continue
-                    
-                    detail_url = raw_href if raw_href.startswith("http") else f"{base_url}{raw_href}"
-                    
-                    # Extract book and author from URL slug
-                    match = re.search(r"/selections/([^/]+)/?", detail_url, flags=re.IGNORECASE)
-                    if not match:
-                        continue
-                    
-                    slug = match.group(1)
-                    parts = re.split(r"(?i)-by-", slug, maxsplit=1)
-                    
-                    if len(parts) == 2:
-                        book_slug, author_slug = parts
-                    else:
-                        book_slug = slug
-                        author_slug = ""
-                    
-                    title = book_slug.replace("-", " ").title().strip()
-                    author = author_slug.replace("-", " ").title().strip()
-                    
-                    if title:
-                        books.append(Book(
-                            title=title,
-                            author=author,
-                            store_url=detail_url
-                        ))
-                        
-                except Exception as e:
-                    logger.warning(f"Error processing Books & Books item: {e}")
-                    continue
-            
-            logger.info(f"Scraped {len(books)} books from Books & Books")
-            
-        except requests.RequestException as e:
-            logger.error(f"Error scraping Books & Books: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error scraping Books & Books: {e}")
-        
-        return books
+        return staff_picks.scrape_all(self.session, self.rate_limiter, names=["Books & Books"],
+                                      page_cache=self.page_cache)
 
 class BookRecommendationSystem:
     """Main class for book recommendation system"""
     
-    def __init__(self, google_api_key: str, database_url: str):
+    def __init__(self, google_api_key: str, database_url: str, db_session: Optional[DatabaseSession] = None):
         self.enricher = BookDataEnricher(google_api_key)
         self.scraper = BookScraper()
         self.database_url = database_url
-        self.read_books_cache = None
+        self.db_session = db_session or DatabaseSession(database_url)
     
-    def get_read_books(self) -> set:
-        """Get set of already read books from database"""
-        if self.read_books_cache is not None:
-            return self.read_books_cache
-        
-        read_books = set()
+    def filter_unread(self, books: List[Book]) -> List[Book]:
+        """Drop books already in books_read_ratings, matched on the normalized book key in Postgres"""
         try:
-            with psycopg2.connect(self.database_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT LOWER(title), LOWER(author) FROM books_read_ratings")
-                    for row in cur.fetchall():
-                        title, author = row
-                        read_books.add(f"{title}|||{author}")
-            
-            self.read_books_cache = read_books
-            logger.info(f"Loaded {len(read_books)} previously read books")
-            
+            with self.db_session.connection() as conn:
+                positions = unread_positions(conn, [(book.title, book.author) for book in books])
         except Exception as e:
-            logger.error(f"Error loading read books: {e}")
+            logger.error(f"Error filtering already read books: {e}")
+            return books
         
-        return read_books
-    
-    def book_already_read(self, book: Book) -> bool:
-        """Check if book has already been read"""
-        read_books = self.get_read_books()
-        book_key = f"{book.title.lower()}|||{book.author.lower()}"
-        return book_key in read_books
+        logger.info(f"{len(books) - len(positions)} of {len(books)} candidates already read")
+        return [books[position] for position in positions]
     
-    def build_staff_picks_candidate_pool(self) -> List[Book]:
-        """Build candidate pool from bookstore staff picks"""
+    def build_staff_picks_candidate_pool(self, read_history: Optional[List[Tuple[str, str]]] = None) -> List[Book]:
+        """
+        Build candidate pool from bookstore staff picks.
+
+        `read_history` (title, author) pairs, when given, also drop candidates
+        that are near-duplicates of a read book, e.g. a differently formatted
+        title the exact book key misses.
+        """
         logger.info("Building candidate pool from staff picks...")
         
-        all_books = []
-        
-        # Scrape from multiple sources
-        strand_books = self.scraper.scrape_strand_staff_picks()
-        bb_books = self.scraper.scrape_books_and_books_staff_picks()
-        
-        all_books.extend(strand_books)
-        all_books.extend(bb_books)
+        # Scrape every registered store at once; wall time is that of the slowest store
+        all_books = self.scraper.scrape_all_staff_picks()
         
         # Enrich with missing author information
-        enriched_books = []
-        for book in all_books:
-            if not book.author.strip():
-                author = self.enricher.lookup_author_google_books(book.title)
-                book.author = author
-            
-            if book.author:  # Only keep books with authors
-                enriched_books.append(book)
+        self.enricher.fill_authors(all_books)
+        enriched_books = [book for book in all_books if book.author]  # Only keep books with authors
         
         # Remove duplicates and already read books
         unique_books = self._deduplicate_books(enriched_books)
-        filtered_books = [book for book in unique_books if not self.book_already_read(book)]
+        filtered_books = self.filter_unread(unique_books)
+        if read_history:
+            unread = dedup.drop_known(filtered_books, read_history, key=lambda book: (book.title, book.author))
+            logger.info(f"{len(filtered_books) - len(unread)} more candidates are near-duplicates of read books")
+            filtered_books = unread
+        
+        # Year, categories and ISBN for every remaining candidate, so the scorer can use them
+        self.enricher.fill_details(filtered_books)
+        
+        # Remember the enrichment so an unchanged page needs no lookups next time
+        self.scraper.page_cache.update_books(enriched_books)
+        logger.info(f"Google Books: {self.enricher.api_calls} API calls, "
+                    f"{self.enricher.cache.hits} answered from the lookup cache")
+        REPORT.record_cache('google_books_lookups', self.enricher.cache.hits, self.enricher.cache.misses)
+        REPORT.count('staff_pick_pages_unchanged', self.scraper.page_cache.unchanged)
         
         logger.info(f"Built candidate pool of {len(filtered_books)} books")
         return filtered_books
     
     def _deduplicate_books(self, books: List[Book]) -> List[Book]:
-        """Remove duplicate books based on title and author"""
-        seen = set()
-        unique_books = []
-        
-        for book in books:
-            key = f"{book.title.lower()}|||{book.author.lower()}"
-            if key not in seen:
-                seen.add(key)
-                unique_books.append(book)
-        
-        return unique_books
+        """Remove near-duplicate books (same book in another store's title formatting), keeping the first"""
+        return dedup.deduplicate(books, key=lambda book: (book.title, book.author))
     
     def get_daily_recommendation(self) -> Optional[Book]:
         """Get a single book recommendation for today"""
@@ -983,8 +572,9 @@ class BookRecommendationSystem:
         logger.info(f"Recommended: '{recommended_book.title}' by {recommended_book.author}")
         return recommended_book
 
-# Example usage
-def main():
+
+# Example usage (random pick from staff picks, not part of the nightly stages)
+def print_staff_pick_recommendation(db_session: Optional[DatabaseSession] = None):
     # You would get these from environment variables
     google_api_key = os.getenv("GOOGLE_API_KEY")
     database_url = os.getenv("DATABASE_URL")
@@ -998,7 +588,7 @@ def main():
         return
     
     # Initialize recommendation system
-    rec_system = BookRecommendationSystem(google_api_key, database_url)
+    rec_system = BookRecommendationSystem(google_api_key, database_url, db_session=db_session)
     
     # Get daily recommendation
     recommendation = rec_system.get_daily_recommendation()
@@ -1013,128 +603,8 @@ def main():
     else:
         print("No recommendation available today.")
 
-if __name__ == "__main__":
-    main()
-
-try:
-    # Connect to database
-    conn = psycopg2.connect(data_url)
-    cur = conn.cursor()
-    
-    # Create table
-    cur.execute("""
-        DROP TABLE IF EXISTS books_read_ratings;
-        CREATE TABLE books_read_ratings (
-            title VARCHAR(255),
-            author VARCHAR(255),
-            type VARCHAR(255),
-            genre VARCHAR(255),
-            year_read INTEGER,
-            rating FLOAT,
-            source VARCHAR(255),
-            cover_url TEXT,
-            goodreads_rating FLOAT,
-            num_ratings INTEGER,
-            num_editions INTEGER,
-            genres TEXT,
-            type2 VARCHAR(255),
-            ratings_gap FLOAT,
-            ratings_trend VARCHAR(255)
-        );
-    """)
-    
-    # Insert data row by row instead of using copy_from
-    for index, row in df_clean.iterrows():
-        cur.execute("""
-            INSERT INTO books_read_ratings 
-            (title, author, type, genre, year_read, rating, source, cover_url, 
-             goodreads_rating, num_ratings, num_editions, genres, type2, 
-             ratings_gap, ratings_trend)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            row['Title'], row['Author'], row['Type'], row['Genre'],
-            row['Year read'], row['Rating'], row['Source'], row['Cover_url'],
-            row['Goodreads Rating'], row['num_ratings'], row['num_editions'],
-            row['genres'], row['type'], row['Ratings gap'], row['Ratings trend']
-        ))
-    
-    # Commit the transaction
-    conn.commit()
-    
-    # Verify the data
-    cur.execute("SELECT COUNT(*) FROM books_read_ratings")
-    count = cur.fetchone()[0]
-    print(f"Data successfully saved! Total rows: {count}")
-    
-    # Show a sample
-    cur.execute("SELECT * FROM books_read_ratings LIMIT 5")
-    rows = cur.fetchall()
-    print("\nSample of saved data:")
-    for row in rows:
-        print(row)
-        
-except Exception as e:
-    print(f"An error occurred: {str(e)}")
-    
-finally:
-    if 'cur' in locals():
-        cur.close()
-    if 'conn' in locals() and conn is not None:
-        conn.close()
-        print("Connection closed.")
-
-
-
-import os
-
-from dotenv import load_dotenv
-import psycopg2
-import os
-
-
-
-
-try:
-    # Check if running in production
-    is_production = os.getenv("ENV") == "production"
-
-    # Connect to PostgreSQL
-    if is_production:
-        conn = psycopg2.connect(data_url, sslmode="require")
-    else:
-        conn = psycopg2.connect(data_url)  # No SSL for local connections
-    
-    print("Connection to PostgreSQL successful!")
-    
-    # Example: Create a cursor and test the connection
-    cur = conn.cursor()
-    cur.execute("SELECT 1;")
-    print("Test query result:", cur.fetchone())
-    cur.close()
-
-except psycopg2.OperationalError as e:
-    print("Error connecting to the database:", e)
-
-finally:
-    if 'conn' in locals() and conn is not None:
-        conn.close()
-        print("Connection closed.")
-
-
-# Add this to the END of your existing update_database.py file
-# Right after the final database connection test
-
-print("\n" + "="*70)
-print("🧠 INTELLIGENT DAILY BOOK RECOMMENDATION")
-print("="*70)
 
 # ===== INTELLIGENT RECOMMENDATION SYSTEM INTEGRATION =====
-import statistics
-from collections import defaultdict
-from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Tuple
-import random
-
 @dataclass
 class RecommendationBook:
     """Book data class for recommendations"""
@@ -1147,6 +617,9 @@ class RecommendationBook:
     score_breakdown: Dict[str, float] = field(default_factory=dict)
     reasoning: str = ""
     cover_url: str = ""
+    publication_year: int = 0
+    categories: str = ""
+    isbn: str = ""
 
 @dataclass 
 class UserProfile:
@@ -1162,9 +635,14 @@ class UserProfile:
 
 class IntelligentRecommendationEngine:
     """Integrated recommendation engine using existing data"""
+
+    # Genres and sources need at least this many rated books to count in the profile
+    MIN_BOOKS_PER_GROUP = 2
     
-    def __init__(self, df_processed):
+    def __init__(self, df_processed, db_session: Optional[DatabaseSession] = None):
         self.df = df_processed
+        self.db_session = db_session
+        self._goodreads = None
         self.user_profile = self._build_user_profile()
         
         # Scoring weights
@@ -1182,96 +660,77 @@ class IntelligentRecommendationEngine:
         print("🔍 Analyzing your reading patterns...")
         
         profile = UserProfile()
-        
-        # Process each book in the updated dataframe
-        user_ratings = []
-        goodreads_ratings = []
-        genre_scores = defaultdict(list)
-        source_scores = defaultdict(list)
-        
-        for _, row in self.df.iterrows():
-            try:
-                title = str(row.get('Title', '')).strip()
-                author = str(row.get('Author', '')).strip()
-                
-                if not title or not author or title == 'nan' or author == 'nan':
-                    continue
-                
-                # Parse ratings
-                user_rating = 0
-                goodreads_rating = 0
-                
-                try:
-                    user_rating = float(row.get('Rating', 0))
-                except (ValueError, TypeError):
-                    user_rating = 0
-                
-                try:
-                    goodreads_rating = float(row.get('Goodreads Rating', 0))
-                except (ValueError, TypeError):
-                    goodreads_rating = 0
-                
-                # Get other data
-                source = str(row.get('Source', '')).strip()
-                genre = str(row.get('genres', '')).strip()  # Use the enriched genres column
-                
-                # Build profile data
-                book_key = f"{title.lower()}|||{author.lower()}"
-                profile.read_books.add(book_key)
-                
-                profile.user_ratings[book_key] = {
-                    'user_rating': user_rating,
-                    'goodreads_rating': goodreads_rating,
-                    'source': source,
-                    'genre': genre,
-                    'title': title,
-                    'author': author
-                }
-                
-                # Collect data for analysis
-                if user_rating > 0:
-                    user_ratings.append(user_rating)
-                if goodreads_rating > 0:
-                    goodreads_ratings.append(goodreads_rating)
-                
-                # Track favorite authors (4+ stars)
-                if user_rating >= 4.0 and author.lower() not in [a.lower() for a in profile.favorite_authors]:
-                    profile.favorite_authors.append(author)
-                
-                # Analyze genre preferences
-                if genre and user_rating > 0 and genre != 'nan':
-                    genre_scores[genre.lower()].append(user_rating)
-                
-                # Analyze source performance
-                if source and user_rating > 0 and source != 'nan':
-                    source_scores[source].append(user_rating)
-                    
-            except Exception as e:
-                print(f"⚠️  Error processing row: {e}")
-                continue
-        
-        # Calculate profile statistics
-        if user_ratings:
-            profile.average_user_rating = statistics.mean(user_ratings)
-        if goodreads_ratings:
-            profile.average_goodreads_rating = statistics.mean(goodreads_ratings)
-        
+        df = self.df
+
+        def text_column(name):
+            if name not in df.columns:
+                return pd.Series("", index=df.index)
+            column = df[name].astype(object)
+            return column.where(column.notna(), "").astype(str).str.strip()
+
+        def rating_column(name):
+            if name not in df.columns:
+                return pd.Series(0.0, index=df.index)
+            return pd.to_numeric(df[name], errors='coerce').astype(float).fillna(0.0)
+
+        books = pd.DataFrame({
+            'user_rating': rating_column('Rating'),
+            'goodreads_rating': rating_column('Goodreads Rating'),
+            'source': text_column('Source'),
+            'genre': text_column('genres'),  # Use the enriched genres column
+            'title': text_column('Title'),
+            'author': text_column('Author'),
+        })
+        books = books[~books['title'].isin(["", "nan"]) & ~books['author'].isin(["", "nan"])]
+        book_keys = books['title'].str.lower() + "|||" + books['author'].str.lower()
+
+        # Later rows win for a book that appears more than once
+        latest = books.set_index(book_keys)
+        latest = latest[~latest.index.duplicated(keep='last')]
+        profile.read_books = set(latest.index)
+        # Plain zips: DataFrame.to_dict('index') boxes every cell and dominates the build
+        columns = list(latest.columns)
+        rows = zip(*(latest[column].tolist() for column in columns))
+        profile.user_ratings = {key: dict(zip(columns, row)) for key, row in zip(latest.index, rows)}
+
+        # Profile statistics over every rated row
+        rated = books[books['user_rating'] > 0]
+        crowd_rated = books['goodreads_rating'][books['goodreads_rating'] > 0]
+        if len(rated):
+            profile.average_user_rating = float(rated['user_rating'].mean())
+        if len(crowd_rated):
+            profile.average_goodreads_rating = float(crowd_rated.mean())
+
         # Calculate rating bias
-        if user_ratings and goodreads_ratings and len(user_ratings) == len(goodreads_ratings):
+        if len(rated) and len(crowd_rated) and len(rated) == len(crowd_rated):
             profile.rating_bias = profile.average_user_rating - profile.average_goodreads_rating
-        
-        # Calculate genre preferences
-        for genre, ratings in genre_scores.items():
-            if ratings and len(ratings) >= 2:  # Need at least 2 books
-                profile.genre_preferences[genre] = statistics.mean(ratings)
-        
-        # Calculate source performance
-        for source, ratings in source_scores.items():
-            if ratings and len(ratings) >= 2:  # Need at least 2 books
-                profile.source_performance[source] = statistics.mean(ratings)
+
+        # Favorite authors (4+ stars), first spelling seen, case-insensitively unique
+        favorites = books['author'][books['user_rating'] >= 4.0]
+        profile.favorite_authors = favorites[~favorites.str.lower().duplicated()].tolist()
+
+        profile.genre_preferences = self._mean_rating_by(rated, rated['genre'], lowercase=True)
+        profile.source_performance = self._mean_rating_by(rated, rated['source'])
         
         return profile
+
+    @staticmethod
+    def _mean_rating_by(rated: pd.DataFrame, keys: pd.Series, lowercase: bool = False) -> Dict[str, float]:
+        """Mean user rating per key, for keys with at least MIN_BOOKS_PER_GROUP rated books"""
+        known = ~keys.isin(["", "nan"])
+        keys = keys[known].str.lower() if lowercase else keys[known]
+        stats = rated['user_rating'][known].groupby(keys, sort=False).agg(['mean', 'count'])
+        stats = stats[stats['count'] >= IntelligentRecommendationEngine.MIN_BOOKS_PER_GROUP]
+        return {key: float(mean) for key, mean in stats['mean'].items()}
     
+    def _goodreads_lookup(self):
+        """One memoized Goodreads lookup per engine, so no title is searched twice in a run"""
+        if self._goodreads is None:
+            from goodreads import GoodreadsLookup
+
+            self._goodreads = GoodreadsLookup()
+        return self._goodreads
+
     def _get_real_candidates(self) -> List[RecommendationBook]:
         """Get real candidate books from bookstore staff picks"""
         print("📚 Fetching real-time staff picks from bookstores...")
@@ -1279,26 +738,28 @@ class IntelligentRecommendationEngine:
         # Initialize the existing recommendation system
         rec_system = BookRecommendationSystem(
             google_api_key=os.getenv("GOOGLE_API_KEY"),
-            database_url=os.getenv("DATABASE_URL")
+            database_url=os.getenv("DATABASE_URL"),
+            db_session=self.db_session
         )
         
-        # Get candidate books from real sources
-        candidate_pool = rec_system.build_staff_picks_candidate_pool()
+        # Get candidate books from real sources, minus near-duplicates of the reading history
+        read_history = [(book['title'], book['author']) for book in self.user_profile.user_ratings.values()]
+        candidate_pool = rec_system.build_staff_picks_candidate_pool(read_history=read_history)
+
+        goodreads = self._goodreads_lookup()
         
         # Convert Book objects to RecommendationBook objects
         recommendation_candidates = []
         for book in candidate_pool:
-            # Try to get cover URL by searching Goodreads
-            cover_url = ""
-            try:
-                # Reuse the existing Goodreads search functionality
-                search_results = fetch_goodreads_search_results(book.title)
-                if search_results:
-                    parsed_books = parse_goodreads_search_results(search_results)
-                    if parsed_books and len(parsed_books) > 0:
-                        cover_url = parsed_books[0].get('cover_image_url', '')
-            except Exception as e:
-                print(f"Could not fetch cover for {book.title}: {e}")
+            # Cover and real rating from a lookup-only Goodreads search (no genre classification);
+            # books from an unchanged staff-picks page already carry them from a previous run
+            if not (book.cover_url and book.goodreads_rating):
+                try:
+                    details = goodreads.lookup(book.title, fields=('cover_image_url', 'rating'))
+                    book.goodreads_rating = book.goodreads_rating or details.get('rating') or 0.0
+                    book.cover_url = book.cover_url or details.get('cover_image_url') or ""
+                except Exception as e:
+                    print(f"Could not look up {book.title} on Goodreads: {e}")
             
             rec_book = RecommendationBook(
                 title=book.title,
@@ -1306,171 +767,190 @@ class IntelligentRecommendationEngine:
                 source="Staff Picks",
                 store_url=book.store_url,
                 goodreads_rating=book.goodreads_rating,
-                cover_url=cover_url  # Include the cover URL
+                cover_url=book.cover_url,
+                publication_year=book.publication_year,
+                categories=book.genres,
+                isbn=book.isbn
             )
             recommendation_candidates.append(rec_book)
+        rec_system.scraper.page_cache.update_books(candidate_pool)
         
-        print(f"✅ Found {len(recommendation_candidates)} fresh recommendations")
+        print(f"✅ Found {len(recommendation_candidates)} fresh recommendations "
+              f"({goodreads.fetches} Goodreads searches, {goodreads.memo_hits} answered from memo)")
+        REPORT.record_cache('goodreads_lookup_memo', goodreads.memo_hits, goodreads.fetches)
         return recommendation_candidates
     
     def _score_book(self, book: RecommendationBook) -> Tuple[float, Dict[str, float]]:
         """Score a book based on user preferences"""
-        scores = {}
-        
-        # 1. Goodreads Quality Score
-        rating = book.goodreads_rating or 3.5
-        scores['goodreads_quality'] = min(rating / 5.0, 1.0)
-        
-        # 2. User Taste Alignment
-        predicted_user_rating = rating + self.user_profile.rating_bias
-        predicted_user_rating = max(1.0, min(5.0, predicted_user_rating))
-        scores['user_taste_alignment'] = predicted_user_rating / 5.0
-        
-        # 3. Favorite Author Boost
-        author_lower = book.author.lower()
-        if author_lower in [a.lower() for a in self.user_profile.favorite_authors]:
-            scores['favorite_author_boost'] = 1.0
-            book.reasoning = f"⭐ Favorite author: {book.author}!"
+        top = self.score_candidates([book], top_k=1)[0]
+        return top.recommendation_score, top.score_breakdown
+
+    def _source_scores(self, sources: List[str]) -> np.ndarray:
+        """Reliability per candidate source: the first user source contained in it, else neutral"""
+        by_source = {}
+        for source in set(sources):
+            score = 0.5
+            if source:
+                for user_source, avg_rating in self.user_profile.source_performance.items():
+                    if user_source.lower() in source.lower():
+                        score = avg_rating / 5.0
+                        break
+            by_source[source] = score
+        return np.array([by_source[source] for source in sources], dtype=float)
+
+    def _genre_scores(self, categories: List[str]) -> np.ndarray:
+        """Preference per candidate: the user's best-rated genre found in its categories, else neutral"""
+        by_categories = {}
+        for value in set(categories):
+            text = value.lower()
+            matches = [avg for genre, avg in self.user_profile.genre_preferences.items() if genre and genre in text]
+            by_categories[value] = max(matches) / 5.0 if matches else 0.5
+        return np.array([by_categories[value] for value in categories], dtype=float)
+
+    def score_candidates(self, books: List[RecommendationBook], top_k: int = 1) -> List[RecommendationBook]:
+        """
+        Score all candidates in one matrix operation and return the best `top_k`.
+
+        Each factor is a column of the feature matrix and `self.weights` the
+        weight vector; only the top K are selected (argpartition) and get their
+        score, per-factor breakdown and reasoning filled in. Ties are broken by
+        list order, as a stable sort of all the scores would.
+        """
+        if not books:
+            return []
+
+        factors = list(self.weights)
+        weights = np.array([self.weights[factor] for factor in factors])
+        favorite_authors = {author.lower() for author in self.user_profile.favorite_authors}
+
+        ratings = np.array([book.goodreads_rating or 3.5 for book in books], dtype=float)
+        is_favorite = np.array([book.author.lower() in favorite_authors for book in books])
+        neutral = np.full(len(books), 0.5)
+
+        columns = {
+            # 1. Goodreads Quality Score
+            'goodreads_quality': np.minimum(ratings / 5.0, 1.0),
+            # 2. User Taste Alignment
+            'user_taste_alignment': np.clip(ratings + self.user_profile.rating_bias, 1.0, 5.0) / 5.0,
+            # 3. Favorite Author Boost
+            'favorite_author_boost': np.where(is_favorite, 1.0, 0.3),
+            # 4. Genre Preference (Google Books categories against the user's genre ratings)
+            'genre_preference': self._genre_scores([book.categories for book in books]),
+            # 5. Source Reliability
+            'source_reliability': self._source_scores([book.source for book in books]),
+            # 6. Popularity Balance (neutral without popularity data)
+            'popularity_balance': neutral,
+        }
+        features = np.column_stack([columns[factor] for factor in factors])
+        scores = features @ weights
+
+        # Partial selection of the K-th best score, widened to every candidate tied with it, then a
+        # stable order among those (ties keep list order) cut back to K
+        top_k = max(1, min(top_k, len(books)))
+        if top_k < len(books):
+            kth_score = scores[np.argpartition(-scores, top_k - 1)[top_k - 1]]
+            top = np.flatnonzero(scores >= kth_score)
         else:
-            scores['favorite_author_boost'] = 0.3
-            book.reasoning = "New discovery from staff picks"
-        
-        # 4. Genre Preference (simplified - would need genre data for candidates)
-        scores['genre_preference'] = 0.5  # Neutral
-        
-        # 5. Source Reliability
-        source_score = 0.5
-        if book.source and self.user_profile.source_performance:
-            for user_source, avg_rating in self.user_profile.source_performance.items():
-                if user_source.lower() in book.source.lower():
-                    source_score = avg_rating / 5.0
-                    break
-        scores['source_reliability'] = source_score
-        
-        # 6. Popularity Balance
-        scores['popularity_balance'] = 0.5  # Neutral without popularity data
-        
-        # Calculate weighted final score
-        final_score = sum(scores[factor] * self.weights[factor] for factor in scores)
-        
-        return final_score, scores
-    
-def get_intelligent_recommendation(self) -> Optional[RecommendationBook]:
-    """Get an intelligent book recommendation"""
-    
-    # Print profile summary
-    print(f"📊 Your Reading Profile:")
-    print(f"   • Books analyzed: {len(self.user_profile.read_books)}")
-    print(f"   • Average rating: {self.user_profile.average_user_rating:.1f}★")
-    print(f"   • Goodreads average: {self.user_profile.average_goodreads_rating:.1f}★")
-    print(f"   • Rating bias: {self.user_profile.rating_bias:+.1f} vs crowd")
-    print(f"   • Favorite authors: {len(self.user_profile.favorite_authors)}")
+            top = np.arange(len(books))
+        top = top[np.lexsort((top, -scores[top]))][:top_k]
+
+        selected = []
+        for index in top:
+            book = books[index]
+            book.recommendation_score = float(scores[index])
+            book.score_breakdown = {factor: float(value) for factor, value in zip(factors, features[index])}
+            if is_favorite[index]:
+                book.reasoning = f"⭐ Favorite author: {book.author}!"
+            else:
+                book.reasoning = "New discovery from staff picks"
+            selected.append(book)
+        return selected
     
-    if self.user_profile.genre_preferences:
-        top_genres = sorted(self.user_profile.genre_preferences.items(), 
-                          key=lambda x: x[1], reverse=True)[:3]
-        print(f"   • Top genres: {[(g, f'{r:.1f}★') for g, r in top_genres]}")
+    def get_intelligent_recommendation(self) -> Optional[RecommendationBook]:
+        """Get an intelligent book recommendation"""
     
-    if self.user_profile.source_performance:
-        top_sources = sorted(self.user_profile.source_performance.items(), 
-                            key=lambda x: x[1], reverse=True)[:3]
-        print(f"   • Best sources: {[(s, f'{r:.1f}★') for s, r in top_sources]}")
+        # Print profile summary
+        print(f"📊 Your Reading Profile:")
+        print(f"   • Books analyzed: {len(self.user_profile.read_books)}")
+        print(f"   • Average rating: {self.user_profile.average_user_rating:.1f}★")
+        print(f"   • Goodreads average: {self.user_profile.average_goodreads_rating:.1f}★")
+        print(f"   • Rating bias: {self.user_profile.rating_bias:+.1f} vs crowd")
+        print(f"   • Favorite authors: {len(self.user_profile.favorite_authors)}")
     
-    # Get candidates and filter
-    candidates = self._get_real_candidates()
+        if self.user_profile.genre_preferences:
+            top_genres = sorted(self.user_profile.genre_preferences.items(), 
+                              key=lambda x: x[1], reverse=True)[:3]
+            print(f"   • Top genres: {[(g, f'{r:.1f}★') for g, r in top_genres]}")
     
-    # Filter out already read books
-    unread_candidates = []
-    for book in candidates:
-        book_key = f"{book.title.lower()}|||{book.author.lower()}"
-        if book_key not in self.user_profile.read_books:
-            unread_candidates.append(book)
+        if self.user_profile.source_performance:
+            top_sources = sorted(self.user_profile.source_performance.items(), 
+                                key=lambda x: x[1], reverse=True)[:3]
+            print(f"   • Best sources: {[(s, f'{r:.1f}★') for s, r in top_sources]}")
     
-    if not unread_candidates:
-        print("\n😞 All candidate books have already been read!")
-        return None
+        # Candidates come back already filtered against books_read_ratings
+        unread_candidates = self._get_real_candidates()
     
-    print(f"\n🎯 Scoring {len(unread_candidates)} unread books...")
+        if not unread_candidates:
+            print("\n😞 All candidate books have already been read!")
+            return None
     
-    # Score each candidate
-    for book in unread_candidates:
-        score, score_breakdown = self._score_book(book)
-        book.recommendation_score = score
-        book.score_breakdown = score_breakdown
+        print(f"\n🎯 Scoring {len(unread_candidates)} unread books...")
     
-    # Sort by score and return top recommendation
-    unread_candidates.sort(key=lambda x: x.recommendation_score, reverse=True)
+        # Score every candidate at once; only the winner and three alternatives are needed
+        unread_candidates = self.score_candidates(unread_candidates, top_k=4)
     
-    top_book = unread_candidates[0]
+        top_book = unread_candidates[0]
     
-    # FETCH COVER URL FOR THE RECOMMENDED BOOK
-    print(f"\n🖼️  Fetching cover image for {top_book.title}...")
-    try:
-        # Use existing Goodreads search functionality
-        search_results = fetch_goodreads_search_results(top_book.title)
-        if search_results:
-            parsed_books = parse_goodreads_search_results(search_results)
-            if parsed_books and len(parsed_books) > 0:
-                # Get the cover URL from the first result
-                cover_url = parsed_books[0].get('cover_image_url', '')
-                if cover_url:
-                    top_book.cover_url = cover_url
-                    print(f"✅ Found cover URL: {cover_url[:50]}...")
-                else:
-                    print("❌ No cover URL found in search results")
-                    top_book.cover_url = ""
-            else:
-                print("❌ No books found in search results")
-                top_book.cover_url = ""
-        else:
-            print("❌ Could not fetch Goodreads data")
-            top_book.cover_url = ""
-    except Exception as e:
-        print(f"⚠️  Error fetching cover: {e}")
-        top_book.cover_url = ""
+        # The cover was looked up with the candidates; a retry is answered from the per-run memo
+        if not top_book.cover_url:
+            try:
+                top_book.cover_url = self._goodreads_lookup().lookup(
+                    top_book.title, fields=('cover_image_url',))['cover_image_url'] or ""
+            except Exception as e:
+                print(f"⚠️  Error fetching cover: {e}")
+        print(f"🖼️  Cover URL: {top_book.cover_url[:50] + '...' if top_book.cover_url else 'not found'}")
     
-    print(f"\n🏆 TODAY'S INTELLIGENT RECOMMENDATION:")
-    print("="*50)
-    print(f"📖 {top_book.title}")
-    print(f"👤 by {top_book.author}")
-    print(f"⭐ Recommendation Score: {top_book.recommendation_score:.3f}")
-    print(f"🌟 Goodreads Rating: {top_book.goodreads_rating:.1f}★")
-    print(f"🏪 Source: {top_book.source}")
-    print(f"💡 Why: {top_book.reasoning}")
-    print(f"🖼️  Cover: {'Yes' if top_book.cover_url else 'No'}")
+        print(f"\n🏆 TODAY'S INTELLIGENT RECOMMENDATION:")
+        print("="*50)
+        print(f"📖 {top_book.title}")
+        print(f"👤 by {top_book.author}")
+        print(f"⭐ Recommendation Score: {top_book.recommendation_score:.3f}")
+        print(f"🌟 Goodreads Rating: {top_book.goodreads_rating:.1f}★")
+        print(f"🏪 Source: {top_book.source}")
+        print(f"💡 Why: {top_book.reasoning}")
+        print(f"🖼️  Cover: {'Yes' if top_book.cover_url else 'No'}")
     
-    print(f"\n📊 Score Breakdown:")
-    for factor, score in top_book.score_breakdown.items():
-        weight = self.weights.get(factor, 0)
-        contribution = score * weight
-        factor_name = factor.replace('_', ' ').title()
-        print(f"   {factor_name}: {score:.3f} × {weight:.2f} = {contribution:.3f}")
+        print(f"\n📊 Score Breakdown:")
+        for factor, score in top_book.score_breakdown.items():
+            weight = self.weights.get(factor, 0)
+            contribution = score * weight
+            factor_name = factor.replace('_', ' ').title()
+            print(f"   {factor_name}: {score:.3f} × {weight:.2f} = {contribution:.3f}")
     
-    # Show alternatives
-    if len(unread_candidates) > 1:
-        print(f"\n🎲 Other strong candidates:")
-        for book in unread_candidates[1:4]:
-            print(f"   • '{book.title}' by {book.author} (Score: {book.recommendation_score:.3f})")
+        # Show alternatives
+        if len(unread_candidates) > 1:
+            print(f"\n🎲 Other strong candidates:")
+            for book in unread_candidates[1:4]:
+                print(f"   • '{book.title}' by {book.author} (Score: {book.recommendation_score:.3f})")
     
-    # Log recommendation to file
-    try:
-        from datetime import datetime
-        log_file = os.path.expanduser('~/daily_book_recommendations.log')
-        with open(log_file, 'a') as f:
-            f.write(f"{datetime.now().date()}: {top_book.title} by {top_book.author} "
-                   f"(Score: {top_book.recommendation_score:.3f})\n")
-    except:
-        pass
+        # Log recommendation to file
+        try:
+            from datetime import datetime
+            log_file = os.path.expanduser('~/daily_book_recommendations.log')
+            with open(log_file, 'a') as f:
+                f.write(f"{datetime.now().date()}: {top_book.title} by {top_book.author} "
+                       f"(Score: {top_book.recommendation_score:.3f})\n")
+        except:
+            pass
     
-    return top_book
+        return top_book
 
 # ===== INTEGRATION WITH EXISTING SCRIPT =====
-def run_intelligent_recommendation():
+def run_intelligent_recommendation(df_clean: pd.DataFrame, db_session: Optional[DatabaseSession] = None):
     """Run the intelligent recommendation using the processed data"""
     try:
-        # Use the df_clean that was already created in the main script
-        if 'df_clean' in globals() and len(df_clean) > 0:
-            recommendation_engine = IntelligentRecommendationEngine(df_clean)
+        if df_clean is not None and len(df_clean) > 0:
+            recommendation_engine = IntelligentRecommendationEngine(df_clean, db_session=db_session)
             recommendation = recommendation_engine.get_intelligent_recommendation()
             
             if recommendation:
@@ -1485,21 +965,14 @@ def run_intelligent_recommendation():
             
     except Exception as e:
         print(f"❌ Error generating recommendation: {e}")
+        REPORT.fail_stage(e)
         return None
 
-# ===== RUN THE RECOMMENDATION =====
-if __name__ == "__main__":
-    # This will run automatically when the script is executed
-    print("\n🚀 Running intelligent recommendation system...")
-    recommendation = run_intelligent_recommendation()
-    
-    if recommendation:
-        try:
-            # Create a NEW connection for the recommendation
-            import psycopg2
-            conn_rec = psycopg2.connect(data_url)
-            cur = conn_rec.cursor()
-            
+
+def save_recommendation(db_session: DatabaseSession, recommendation: RecommendationBook):
+    """Store today's recommendation in daily_recommendations"""
+    try:
+        with db_session.cursor() as cur:
             # Create recommendations table if it doesn't exist
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS daily_recommendations (
@@ -1516,7 +989,7 @@ if __name__ == "__main__":
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
             """)
-            
+
             # Save today's recommendation
             cur.execute("""
                 INSERT INTO daily_recommendations 
@@ -1536,15 +1009,269 @@ if __name__ == "__main__":
                 recommendation.reasoning,
                 recommendation.cover_url
             ))
+        print("✅ Recommendation saved to database!")
+        
+    except Exception as e:
+        print(f"Error saving recommendation: {e}")
+        REPORT.fail_stage(e)
+
+
+# ===== PIPELINE STAGES =====
+@dataclass
+class PipelineContext:
+    """State handed from one stage to the next"""
+    full_refresh: bool = False
+    workers: int = 4
+    df_raw: Optional[pd.DataFrame] = None
+    df_processed: Optional[pd.DataFrame] = None
+    df_clean: Optional[pd.DataFrame] = None
+    recommendation: Optional["RecommendationBook"] = None
+    _credentials: object = None
+    _sheets_service: object = None
+    _db_session: Optional[DatabaseSession] = None
+
+    @property
+    def credentials(self):
+        """Google service-account credentials, created on first use"""
+        if self._credentials is None:
+            from oauth2client.service_account import ServiceAccountCredentials
+
+            sa_json_b64 = require_env(
+                "GOOGLE_SERVICE_ACCOUNT_JSON_B64",
+                "Add it as a GitHub secret or in your local .env."
+            )
+            sa_path = tempfile.NamedTemporaryFile(delete=False, suffix=".json").name
+            with open(sa_path, "wb") as f:
+                f.write(base64.b64decode(sa_json_b64))
+            # Reauthorize with explicit scopes
+            self._credentials = ServiceAccountCredentials.from_json_keyfile_name(sa_path, scopes=SCOPES)
+        return self._credentials
+
+    @property
+    def sheets_service(self):
+        """Sheets v4 API client, used for the diff-based write-back"""
+        if self._sheets_service is None:
+            from googleapiclient.discovery import build
+
+            self._sheets_service = build('sheets', 'v4', credentials=self.credentials, cache_discovery=False)
+        return self._sheets_service
+
+    @property
+    def db_session(self) -> DatabaseSession:
+        """One session shared by every stage that talks to Postgres"""
+        if self._db_session is None:
+            self._db_session = DatabaseSession(
+                require_env("DATABASE_URL"),
+                pool_size=int(os.getenv("DB_POOL_SIZE", "1"))
+            )
+        return self._db_session
+
+    def read_worksheet(self, title: str) -> pd.DataFrame:
+        import gspread
+
+        spreadsheet_id = require_env("SPREADSHEET_ID")
+        workbook = gspread.authorize(self.credentials).open_by_key(spreadsheet_id)
+        values = workbook.worksheet(title).get_all_values()
+        return pd.DataFrame(values[1:], columns=values[0])
+
+    def close(self):
+        if self._db_session is not None:
+            print(self._db_session.report())
+            REPORT.record_database(self._db_session)
+            self._db_session.close()
+
+
+def clean_for_database(df: pd.DataFrame) -> pd.DataFrame:
+    """Clean DataFrame before database insertion"""
+    return clean_counts(clean_ratings(df))
+
+
+def stage_pull(ctx: PipelineContext):
+    """Read the 'raw' worksheet"""
+    ctx.df_raw = ctx.read_worksheet('raw')
+    print(f"Pulled {len(ctx.df_raw)} rows from the 'raw' worksheet")
+
+
+def stage_enrich(ctx: PipelineContext):
+    """Enrich with Goodreads/OpenAI, clean, and write the 'updated' worksheet"""
+    from sheet_writer import write_worksheet_diff
+
+    require_env("OPENAI_API_KEY")
+    spreadsheet_id = require_env("SPREADSHEET_ID")
+    if ctx.df_raw is None:
+        stage_pull(ctx)
+    df1 = ctx.df_raw.copy()
+
+    enrichment_cache = EnrichmentCache(os.getenv("ENRICHMENT_CACHE_PATH", DEFAULT_CACHE_PATH))
+    update_spreadsheet(
+        df1,
+        cache=enrichment_cache,
+        incremental=not ctx.full_refresh,
+        max_workers=ctx.workers,
+        requests_per_second=float(os.getenv("GOODREADS_REQUESTS_PER_SECOND", "0.5")),
+        burst=float(os.getenv("GOODREADS_BURST", "1")),
+    )
+    enrichment_cache.close()
+
+    # Missing ratings stay missing (nullable dtypes) rather than becoming 0
+    df1 = clean_ratings(df1)
+
+    written = write_worksheet_diff(ctx.sheets_service, spreadsheet_id, 'updated', df1)
+    print(f"Wrote {written['changed_cells']} changed cells to the 'updated' worksheet "
+          f"({written['write_requests']} write requests)")
+
+    ctx.df_processed = df1
+    ctx.df_clean = clean_for_database(df1)
+
+    # Calculate source performance
+    source_performance = calculate_source_performance(ctx.df_clean)
+    print("Source Performance Analysis:")
+    print(source_performance)
+
+
+def stage_load(ctx: PipelineContext):
+    """Load the processed books into books_read_ratings"""
+    if ctx.df_clean is None:
+        # Load-only run: the enriched data is already in the 'updated' worksheet
+        ctx.df_clean = clean_for_database(ctx.read_worksheet('updated'))
+
+    try:
+        with ctx.db_session.connection() as conn:
+            if os.getenv("BOOKS_LOAD_MODE", "sync") == "swap":
+                # Stream the rows into a staging table and swap it in atomically
+                copy_swap_books_table(conn, ctx.df_clean)
+            else:
+                # Only write rows whose fingerprint changed since the last run
+                changes = sync_books_table(conn, ctx.df_clean)
+                print(f"Row changes: {changes}")
+
+            with conn.cursor() as cur:
+                # Verify the data
+                cur.execute("SELECT COUNT(*) FROM books_read_ratings")
+                count = cur.fetchone()[0]
+                print(f"Data successfully saved! Total rows: {count}")
+                
+                # Show a sample
+                cur.execute("SELECT * FROM books_read_ratings LIMIT 5")
+                rows = cur.fetchall()
+                print("\nSample of saved data:")
+                for row in rows:
+                    print(row)
             
-            conn_rec.commit()
-            cur.close()
-            conn_rec.close()
-            print("✅ Recommendation saved to database!")
-            
-        except Exception as e:
-            print(f"Error saving recommendation: {e}")
+    except Exception as e:
+        print(f"An error occurred: {str(e)}")
+        REPORT.fail_stage(e)
+
+
+def read_books_table(db_session: DatabaseSession) -> pd.DataFrame:
+    """Processed reading history as stored by the load stage, with the sheet's column names"""
+    with db_session.cursor() as cur:
+        cur.execute("""
+            SELECT title AS "Title", author AS "Author", type AS "Type", genre AS "Genre",
+                   year_read AS "Year read", rating AS "Rating", source AS "Source",
+                   cover_url AS "Cover_url", goodreads_rating AS "Goodreads Rating",
+                   num_ratings, num_editions, genres, type2 AS type,
+                   ratings_gap AS "Ratings gap", ratings_trend AS "Ratings trend"
+            FROM books_read_ratings
+        """)
+        columns = [description[0] for description in cur.description]
+        return pd.DataFrame(cur.fetchall(), columns=columns)
+
+
+def stage_recommend(ctx: PipelineContext):
+    """Pick today's recommendation and save it"""
+    print("\n" + "="*70)
+    print("🧠 INTELLIGENT DAILY BOOK RECOMMENDATION")
+    print("="*70)
+
+    if ctx.df_clean is None:
+        # Recommend-only run: use the history loaded on a previous run
+        ctx.df_clean = read_books_table(ctx.db_session)
+
+    print("\n🚀 Running intelligent recommendation system...")
+    ctx.recommendation = run_intelligent_recommendation(ctx.df_clean, ctx.db_session)
+    if ctx.recommendation:
+        save_recommendation(ctx.db_session, ctx.recommendation)
+
+
+def read_latest_recommendation(db_session: DatabaseSession) -> Optional[Dict]:
+    """Most recent row of daily_recommendations, as served by /api/daily-recommendation"""
+    with db_session.cursor() as cur:
+        cur.execute("""
+            SELECT title, author, source, goodreads_rating, recommendation_score, reasoning, cover_url, date
+            FROM daily_recommendations
+            ORDER BY date DESC
+            LIMIT 1
+        """)
+        row = cur.fetchone()
+        if row is None:
+            return None
+        return dict(zip([description[0] for description in cur.description], row))
 
 
+def stage_snapshot(ctx: PipelineContext):
+    """Write the compressed dataset snapshot and publish it for /api/book-snapshot"""
+    from snapshot import publish_snapshot, write_snapshot
 
+    if ctx.df_clean is None:
+        # Snapshot-only run: use what the previous stages stored
+        ctx.df_clean = read_books_table(ctx.db_session)
+    if ctx.recommendation is not None:
+        from datetime import date
 
+        recommendation = dict(asdict(ctx.recommendation), date=date.today().isoformat())
+    else:
+        recommendation = read_latest_recommendation(ctx.db_session)
+
+    manifest = write_snapshot(ctx.df_clean, recommendation)
+    print(f"📦 Snapshot {manifest['version']}: {manifest['book_count']} books, {manifest['sizes']}")
+    with ctx.db_session.connection() as conn:
+        if publish_snapshot(conn, manifest):
+            print(f"📦 Published snapshot {manifest['version']}")
+
+
+STAGE_FUNCTIONS = {
+    'pull': stage_pull,
+    'enrich': stage_enrich,
+    'load': stage_load,
+    'recommend': stage_recommend,
+    'snapshot': stage_snapshot,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    # Before the parser, whose defaults come from the environment
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Update the reading dashboard data.")
+    parser.add_argument('stage', nargs='?', default='all', choices=STAGES + ['all'],
+                        help="stage to run (default: all)")
+    parser.add_argument('--full-refresh', action='store_true',
+                        default=os.getenv("ENRICHMENT_FULL_REFRESH", "").lower() in ("1", "true", "yes"),
+                        help="refetch every row instead of only new or stale ones")
+    parser.add_argument('--workers', type=int, default=int(os.getenv("ENRICHMENT_WORKERS", "4")),
+                        help="concurrent Goodreads lookups during enrichment")
+    parser.add_argument('--report', default=os.getenv("RUN_REPORT_PATH", DEFAULT_REPORT_PATH),
+                        help="where to write the JSON run report")
+    parser.add_argument('--profile', action='store_true',
+                        help="run each stage under cProfile and tracemalloc and add the results to the report")
+    args = parser.parse_args(argv)
+
+    ctx = PipelineContext(full_refresh=args.full_refresh, workers=args.workers)
+    stages = STAGES if args.stage == 'all' else [args.stage]
+    profile_dir = os.path.join(os.path.dirname(os.path.abspath(args.report)), "profiles") if args.profile else None
+    try:
+        for stage in stages:
+            with REPORT.stage(stage, profile_dir=profile_dir):
+                STAGE_FUNCTIONS[stage](ctx)
+    finally:
+        ctx.close()
+        REPORT.count('throttled_responses', SHARED_LIMITER.throttled)
+        print(f"📝 Run report written to {REPORT.write(args.report)}")
+    if REPORT.failed:
+        sys.exit("❌ One or more stages failed, see the run report")
+
+
+if __name__ == "__main__":
+    main()